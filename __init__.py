@@ -8,7 +8,9 @@ from .node import (ResetModelPatcherCalculateWeight,
                    GetTextMask,
                    DetailTransferAdd,
                    DetailTransferLatentAdd,
+                   MaskRefine,
                    DynamicImageResize)
+from .profiling import instrument_nodes
 
 
 NODE_CLASS_MAPPINGS = {
@@ -20,6 +22,7 @@ NODE_CLASS_MAPPINGS = {
     "GetTextMask": GetTextMask,
     "DetailTransferAdd":DetailTransferAdd,
     "DetailTransferLatentAdd":DetailTransferLatentAdd,
+    "MaskRefine":MaskRefine,
     "DynamicImageResize":DynamicImageResize
 }
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -31,7 +34,11 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "GetTextMask": "Get text mask OCR (middlek)",
     "DetailTransferAdd":"Detail transfer mode:add (middlek)",
     "DetailTransferLatentAdd": "Detail transfer latent mode:add (middlek)",
+    "MaskRefine": "Mask refine dilate/erode/feather (middlek)",
     "DynamicImageResize":"Dynamic image resize (middlek)"
 }
 
+# PRODUCTFIX_PROFILE이 설정된 경우 노드 실행을 프로파일링
+instrument_nodes(NODE_CLASS_MAPPINGS)
+
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -1,51 +1,207 @@
 import logging
+import threading
 from functools import wraps
+import torch
 from comfy.samplers import KSamplerX0Inpaint
 
-def inject_ksamplerx0inpaint_call(original_ksampler_call_fn):
+from .utils import repeat_to_batch
+from . import profiling
+
+try:
+    # ComfyUI model patcher wrapper (없는 이전 버전에서는 KSamplerX0Inpaint.__call__ dispatcher 사용)
+    from comfy.patcher_extension import WrappersMP
+    SAMPLER_SAMPLE_WRAPPER = getattr(WrappersMP, "SAMPLER_SAMPLE", None)
+except ImportError:
+    SAMPLER_SAMPLE_WRAPPER = None
+
+WRAPPER_KEY = "productfix_latent_injection"
+
+_install_lock = threading.Lock()
+
+class LatentInjectionState:
+    """
+    sampling 실행 사이에 공유되는 latent injection 상태
+    (model_options가 sampling 마다 복사되어도 같은 객체를 참조)
+    """
+    def __init__(self):
+        self.consumed = False
+
+class LatentInjectionRun:
+    """
+    sampling 실행(KSamplerX0Inpaint 인스턴스) 하나에 대한 latent injection 상태
+    injection 구간을 실행 시작 시 한 번만 계산합니다.
+    """
+    def __init__(self, sampler, latent_inject_options, injected):
+        self.injected = injected
+        sigmas = sampler.sigmas
+        # 배치 항목별 구간 (N,), 값이 하나면 모든 항목에 같은 구간 사용
+        self.start_sigma = torch.as_tensor(latent_inject_options["start_sigma"], dtype=sigmas.dtype, device=sigmas.device).reshape(-1)
+        self.end_sigma = torch.as_tensor(latent_inject_options["end_sigma"], dtype=sigmas.dtype, device=sigmas.device).reshape(-1)
+        if len(self.start_sigma) != len(self.end_sigma):
+            size = max(len(self.start_sigma), len(self.end_sigma))
+            self.start_sigma = repeat_to_batch(self.start_sigma, size)
+            self.end_sigma = repeat_to_batch(self.end_sigma, size)
+        self._windows = {}
+
+        # step 사이의 sigma(heun, dpm2 등)까지 고려해 injection 구간과 sigma 범위가 겹치는지 확인
+        # (실행당 한 번의 host 동기화)
+        sigma_min, sigma_max = torch.aminmax(sigmas)
+        self.any_window = bool(((sigma_max > self.end_sigma) & (sigma_min < self.start_sigma) & (self.start_sigma > self.end_sigma)).any())
+
+    def in_window(self, sigma):
+        # 배치 크기에 맞춘 구간은 배치 크기별로 한 번만 만듦
+        window = self._windows.get(sigma.shape[0], None)
+        if window is None:
+            window = (repeat_to_batch(self.start_sigma, sigma.shape[0]), repeat_to_batch(self.end_sigma, sigma.shape[0]))
+            self._windows[sigma.shape[0]] = window
+        start_sigma, end_sigma = window
+        # step 번호 대신 sigma 값으로 판단 (heun, dpm2 등은 step 사이의 sigma로도 호출됨)
+        return (sigma > end_sigma) & (sigma < start_sigma)
+
+def latent_injection_call(self, x, sigma, denoise_mask, run, model_options={}, seed=None):
+    """
+    latent injection이 적용된 KSamplerX0Inpaint.__call__
+    sigma가 (end_sigma, start_sigma) 구간에 있을 때만 노이즈가 추가된 product latent를 합성하고,
+    원래 inpainting과 달리 모델 출력은 후처리하지 않습니다.
+    """
+    in_window = None
+    if denoise_mask is not None and run.any_window:
+        # 사용자 정의 마스크 함수 적용 (있는 경우)
+        if "denoise_mask_function" in model_options:
+            denoise_mask = model_options["denoise_mask_function"](sigma, denoise_mask, extra_options={"model": self.inner_model, "sigmas": self.sigmas})
+
+        in_window = run.in_window(sigma)
+        # CPU에서는 구간 밖이면 합성을 생략하고,
+        # GPU 등에서는 host 동기화 없이 디바이스에서 구간을 선택
+        if in_window.device.type != "cpu" or bool(in_window.any()):
+            # x * mask + scaled_latent * (1 - mask)를 lerp 한 번으로 계산
+            scaled_latent = self.inner_model.inner_model.model_sampling.noise_scaling(sigma.reshape([sigma.shape[0]] + [1] * (len(self.noise.shape) - 1)), self.noise, self.latent_image)
+            injected_x = torch.lerp(scaled_latent.to(dtype=x.dtype), x, denoise_mask.to(dtype=x.dtype))
+            if in_window.device.type == "cpu" and bool(in_window.all()):
+                x = injected_x
+            else:
+                x = torch.where(in_window.reshape([sigma.shape[0]] + [1] * (x.ndim - 1)), injected_x, x)
+
+    if profiling.PROFILE_ENABLED:
+        profiling.record_sampler_step(in_window)
+
+    # 모델 실행
+    return self.inner_model(x, sigma, model_options=model_options, seed=seed)
+
+def start_latent_injection_run(sampler, latent_inject_options):
+    """
+    sampling 실행(KSamplerX0Inpaint 인스턴스) 하나의 latent injection 적용 여부와 injection 구간을 결정합니다.
+    remain_injected가 False면 옵션을 설정한 model의 첫 번째 실행에만 적용합니다.
+    """
+    state = latent_inject_options["state"]
+    injected = not state.consumed
+    if not latent_inject_options["remain_injected"]:
+        state.consumed = True
+    return LatentInjectionRun(sampler, latent_inject_options, injected)
+
+class LatentInjectionModel:
+    """
+    SAMPLER_SAMPLE wrapper에서 sampler에 model_wrap 대신 넘기는 model
+    KSamplerX0Inpaint는 denoise mask 없이 이 model을 호출하고, 이 model이 latent injection을 적용한 뒤 model_wrap을 호출합니다.
+    나머지 속성(inner_model 등)은 model_wrap의 것을 사용합니다.
+    """
+    def __init__(self, inpaint, denoise_mask, run):
+        self.inpaint = inpaint
+        self.denoise_mask = denoise_mask
+        self.run = run
+
+    def __getattr__(self, name):
+        if name in ("inpaint", "denoise_mask", "run"):
+            raise AttributeError(name)
+        return getattr(self.inpaint.inner_model, name)
+
+    def __call__(self, x, sigma, model_options={}, seed=None):
+        with profiling.step_timer(x.device):
+            return latent_injection_call(self.inpaint, x, sigma, self.denoise_mask, self.run, model_options=model_options, seed=seed)
+
+def latent_injection_sampler_wrapper(executor, model_wrap, sigmas, extra_args, callback, noise, latent_image=None,
+                                     denoise_mask=None, disable_pbar=False):
+    """
+    latent injection SAMPLER_SAMPLE wrapper (set_latent_injection이 model patcher에 등록)
+    latent injection을 적용하는 실행이면 sampler에 denoise mask를 넘기지 않아 기본 inpainting 합성과 후처리를 끄고,
+    model_wrap을 LatentInjectionModel로 감싸서 step 마다 latent injection을 적용합니다.
+    """
+    latent_inject_options = extra_args["model_options"].get("is_latent_inject", None)
+    if latent_inject_options is None:
+        return executor(model_wrap, sigmas, extra_args, callback, noise, latent_image, denoise_mask, disable_pbar)
+
+    # KSamplerX0Inpaint와 같은 속성 (inner_model, sigmas, noise, latent_image)으로 latent_injection_call 실행
+    inpaint = KSamplerX0Inpaint(model_wrap, sigmas)
+    inpaint.latent_image = latent_image
+    inpaint.noise = noise
+    run = start_latent_injection_run(inpaint, latent_inject_options)
+    if not run.injected or denoise_mask is None:
+        return executor(model_wrap, sigmas, extra_args, callback, noise, latent_image, denoise_mask, disable_pbar)
+
+    model = LatentInjectionModel(inpaint, denoise_mask, run)
+    return executor(model, sigmas, extra_args, callback, noise, latent_image, None, disable_pbar)
+
+def install_latent_injection():
+    """
+    KSamplerX0Inpaint.__call__을 latent injection dispatcher로 교체합니다.
+    model patcher wrapper(comfy.patcher_extension)가 없는 이전 ComfyUI에서만 사용합니다. (set_latent_injection 참고)
+
+    이 교체는 프로세스 전역이며 영구적입니다. (한 번만 교체하고 복구하지 않음)
+    ModelPatcher.clone은 model_options를 복사하므로 이 노드 뒤에서 clone 된 model(LoRA loader 등)에도 옵션이 남아 있어,
+    옵션을 설정한 model이 해제된 뒤에도 dispatcher는 유지되어야 하고, 언제 복구해도 되는지 알 수 없습니다.
+    dispatcher는 model_options에 latent injection 옵션이 있는 sampling에만 latent_injection_call을 사용하고,
+    나머지는 원래 함수를 그대로 호출합니다. (옵션이 없으면 dict 조회 한 번의 비용)
+    """
+    current_call = KSamplerX0Inpaint.__call__
+    if getattr(current_call, "_productfix_original", None) is not None:
+        return
+
+    original_ksampler_call_fn = current_call
+
     @wraps(original_ksampler_call_fn)
-    def wrapper(self, x, sigma, denoise_mask, model_options={}, seed=None):
-        
-        # latent injection 옵션 확인
+    def dispatch(self, x, sigma, denoise_mask, model_options={}, seed=None):
         latent_inject_options = model_options.get("is_latent_inject", None)
+        if latent_inject_options is None:
+            return original_ksampler_call_fn(self, x, sigma, denoise_mask, model_options=model_options, seed=seed)
 
-        if latent_inject_options is not None:
-            start_sigma = latent_inject_options["start_sigma"]
-            end_sigma = latent_inject_options["end_sigma"]
-            remain_injected = latent_inject_options["remain_injected"]
-        
-        if denoise_mask is not None:
-            # 사용자 정의 마스크 함수 적용 (있는 경우)
-            if "denoise_mask_function" in model_options:
-                denoise_mask = model_options["denoise_mask_function"](sigma, denoise_mask, extra_options={"model": self.inner_model, "sigmas": self.sigmas})
-            
-            # latent injection 로직
-            if latent_inject_options is not None:
-                if sigma.item() > end_sigma and sigma.item() < start_sigma:
-                    latent_mask = 1. - denoise_mask
-                    scaled_latent = self.inner_model.inner_model.model_sampling.noise_scaling(sigma.reshape([sigma.shape[0]] + [1] * (len(self.noise.shape) - 1)), self.noise, self.latent_image)
-                    x = x * denoise_mask + scaled_latent * latent_mask
-            else:
-                # 기본 inpainting 로직
-                latent_mask = 1. - denoise_mask
-                x = x * denoise_mask + self.inner_model.inner_model.model_sampling.noise_scaling(sigma.reshape([sigma.shape[0]] + [1] * (len(self.noise.shape) - 1)), self.noise, self.latent_image) * latent_mask
-        
-        # 모델 실행
-        out = self.inner_model(x, sigma, model_options=model_options, seed=seed)
-        
-        # 후처리 (latent injection이 아닌 경우에만)
-        if denoise_mask is not None:
-            if latent_inject_options is not None:
-                pass
-            else:
-                out = out * denoise_mask + self.latent_image * latent_mask
+        # sampling 실행(KSamplerX0Inpaint 인스턴스)마다 한 번만 적용 여부와 injection 구간 결정
+        run = getattr(self, "productfix_injection_run", None)
+        if run is None:
+            run = start_latent_injection_run(self, latent_inject_options)
+            self.productfix_injection_run = run
+
+        if not run.injected:
+            return original_ksampler_call_fn(self, x, sigma, denoise_mask, model_options=model_options, seed=seed)
+        with profiling.step_timer(x.device):
+            return latent_injection_call(self, x, sigma, denoise_mask, run, model_options=model_options, seed=seed)
+
+    dispatch._productfix_original = original_ksampler_call_fn
+    KSamplerX0Inpaint.__call__ = dispatch
+    logging.info("\033[94m[middlek latent injection] KSamplerX0Inpaint.__call__ is injected to latent injection dispatcher\033[0m")
+
+def set_latent_injection(model, start_sigma, end_sigma, remain_injected=True):
+    """
+    model(ModelPatcher)의 model_options에 latent injection 옵션을 설정합니다.
+    옵션은 이 model(과 이 model에서 clone 된 model)을 사용하는 sampling에만 적용됩니다.
+    model patcher wrapper를 지원하는 ComfyUI에서는 SAMPLER_SAMPLE wrapper를 이 model에만 등록하고,
+    이전 버전에서는 KSamplerX0Inpaint.__call__을 전역으로 교체합니다. (install_latent_injection 참고)
 
-        if latent_inject_options is not None:
-            # remain injected 옵션에 따라 원래 함수로 복구
-            if remain_injected == False and self.sigmas[-2].item() >= sigma.item():
-                KSamplerX0Inpaint.__call__ = original_ksampler_call_fn
-                logging.info("\033[94m[middlek latent injection] KSamplerX0Inpaint.__call__ return to original_ksampler_call_fn\033[0m")
-                
-        return out
+    Args:
+        model (ModelPatcher): latent injection을 적용할 model (clone 된 model을 넘겨야 함)
+        start_sigma (float | List[float]): injection을 시작할 sigma (리스트면 배치 항목별 값)
+        end_sigma (float | List[float]): injection을 끝낼 sigma (리스트면 배치 항목별 값)
+        remain_injected (bool): False면 이 model의 첫 번째 sampling 실행에만 적용
+    """
+    model.model_options["is_latent_inject"] = {"start_sigma": start_sigma,
+                                               "end_sigma": end_sigma,
+                                               "remain_injected": remain_injected,
+                                               "state": LatentInjectionState()}
+    if SAMPLER_SAMPLE_WRAPPER is not None and hasattr(model, "add_wrapper_with_key"):
+        # 같은 model에 여러 번 설정해도 wrapper는 하나만 유지
+        model.remove_wrappers_with_key(SAMPLER_SAMPLE_WRAPPER, WRAPPER_KEY)
+        model.add_wrapper_with_key(SAMPLER_SAMPLE_WRAPPER, WRAPPER_KEY, latent_injection_sampler_wrapper)
+        return model
 
-    return wrapper
\ No newline at end of file
+    with _install_lock:
+        install_latent_injection()
+    return model
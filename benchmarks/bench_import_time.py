@@ -0,0 +1,79 @@
+"""
+productfix import 시간 측정 (python -X importtime)
+
+ComfyUI 서버 시작 시와 같이 torch, comfy 모듈을 먼저 불러온 뒤 productfix 노드 모듈(node.py)을 불러오는 데 걸린 시간과
+그 중 무거운 외부 의존성(easyocr, cv2, diffusers, torchvision)을 불러오는 데 걸린 시간을 출력합니다.
+노드를 처음 실행할 때까지 미뤄지는 의존성도 비교를 위해 따로 측정합니다.
+
+사용 예:
+    python benchmarks/bench_import_time.py --comfyui /path/to/ComfyUI
+"""
+import os
+import sys
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import get_parser, print_table
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["easyocr", "cv2", "diffusers", "torchvision"]
+
+# 서버 시작 시 이미 불러와져 있는 모듈을 먼저 불러온 뒤 측정 대상 모듈을 불러옴
+IMPORT_SCRIPT = """
+import sys
+sys.path.insert(0, {benchmark_dir!r})
+from common import load_productfix
+load_productfix({comfyui!r}, {stubs!r})
+import torch, folder_paths
+import comfy.model_management, comfy.utils, comfy.samplers, comfy.model_patcher
+sys.stderr.write("--- productfix ---\\n")
+{statement}
+"""
+
+def run_importtime(statement, comfyui, stubs=False):
+    """
+    statement 실행 중 import된 모듈별 누적 import 시간(us)과 전체 시간(us)을 반환합니다.
+    """
+    script = IMPORT_SCRIPT.format(benchmark_dir=BENCHMARK_DIR, comfyui=comfyui, stubs=stubs, statement=statement)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    lines = result.stderr.split("--- productfix ---\n", 1)[1].splitlines()
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative_us)))
+
+    cumulative = {name: us for _, name, us in entries}
+    # 가장 바깥 단계 import의 합이 전체 시간
+    top_level = min((indent for indent, _, _ in entries), default=0)
+    total = sum(us for indent, _, us in entries if indent == top_level)
+    return cumulative, total
+
+def main():
+    parser = get_parser(__doc__)
+    args = parser.parse_args()
+
+    statements = [("node", "import productfix.node"),
+                  ("node + deferred deps", "import productfix.node\n" + "\n".join(f"import {cur}" for cur in HEAVY_MODULES))]
+
+    rows = []
+    for name, statement in statements:
+        runs = [run_importtime(statement, args.comfyui, args.stubs) for _ in range(max(1, args.repeat))]
+        row = {"import": name,
+               "total(ms)": f"{statistics.median(total for _, total in runs) / 1e3:.1f}",
+               "productfix.node(ms)": f"{statistics.median(cur.get('productfix.node', 0) for cur, _ in runs) / 1e3:.1f}"}
+        for module in HEAVY_MODULES:
+            times = [cur[module] for cur, _ in runs if module in cur]
+            row[f"{module}(ms)"] = f"{statistics.median(times) / 1e3:.1f}" if len(times) > 0 else "-"
+        rows.append(row)
+
+    print_table(rows, list(rows[0].keys()))
+
+if __name__ == "__main__":
+    main()
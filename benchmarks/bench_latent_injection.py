@@ -0,0 +1,98 @@
+"""
+latent injection step 벤치마크: 기존 wrapper(step 마다 sigma.item() 동기화)와 현재 dispatcher 비교
+
+모델 실행 시간을 제외한 injection 오버헤드만 보기 위해 입력을 그대로 돌려주는 작은 모델을 사용합니다.
+
+사용 예:
+    python benchmarks/bench_latent_injection.py --comfyui /path/to/ComfyUI --device cuda --size 128
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import get_parser, load_productfix, import_module, measure, print_table
+
+def legacy_injection_call(self, x, sigma, denoise_mask, start_sigma, end_sigma, model_options={}, seed=None):
+    """
+    기존 inject_ksamplerx0inpaint_call wrapper의 latent injection 경로 (비교용)
+    """
+    if denoise_mask is not None:
+        if sigma.item() > end_sigma and sigma.item() < start_sigma:
+            latent_mask = 1. - denoise_mask
+            scaled_latent = self.inner_model.inner_model.model_sampling.noise_scaling(sigma.reshape([sigma.shape[0]] + [1] * (len(self.noise.shape) - 1)), self.noise, self.latent_image)
+            x = x * denoise_mask + scaled_latent * latent_mask
+    out = self.inner_model(x, sigma, model_options=model_options, seed=seed)
+    # remain_injected 확인에서 발생하던 동기화
+    _ = self.sigmas[-2].item() >= sigma.item()
+    return out
+
+class TinyModelSampling:
+    def noise_scaling(self, sigma, noise, latent_image, max_denoise=False):
+        return latent_image + noise * sigma
+
+class TinyModel:
+    """
+    KSamplerX0Inpaint가 요구하는 inner_model.inner_model.model_sampling 구조만 갖춘 모델
+    """
+    def __init__(self):
+        self.inner_model = type("TinyBaseModel", (), {"model_sampling": TinyModelSampling()})()
+
+    def __call__(self, x, sigma, model_options={}, seed=None):
+        return x
+
+class TinyModelPatcher:
+    def __init__(self):
+        self.model_options = {}
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--size", type=int, default=128, help="latent 한 변의 크기")
+    parser.add_argument("--steps", type=int, default=30)
+    args = parser.parse_args()
+
+    load_productfix(args.comfyui, args.stubs)
+    import torch
+    from comfy.samplers import KSamplerX0Inpaint
+    advanced_sampler = import_module("advanced_sampler")
+
+    device = torch.device(args.device)
+    shape = (1, 4, args.size, args.size)
+    sigmas = torch.linspace(14.6, 0.0, args.steps + 1, device=device)
+    start_sigma, end_sigma = 10.0, 0.4
+
+    model = TinyModelPatcher()
+    advanced_sampler.set_latent_injection(model, start_sigma, end_sigma, True)
+    model_options = model.model_options
+
+    def make_sampler():
+        sampler = KSamplerX0Inpaint(TinyModel(), sigmas)
+        sampler.latent_image = torch.randn(shape, device=device)
+        sampler.noise = torch.randn(shape, device=device)
+        return sampler
+
+    x = torch.randn(shape, device=device)
+    denoise_mask = (torch.rand((1, 1) + shape[2:], device=device) > 0.5).float()
+
+    def run_legacy():
+        sampler = make_sampler()
+        for sigma in sigmas[:-1]:
+            legacy_injection_call(sampler, x, sigma.reshape(1), denoise_mask, start_sigma, end_sigma, model_options={})
+
+    def run_current():
+        sampler = make_sampler()
+        for sigma in sigmas[:-1]:
+            sampler(x, sigma.reshape(1), denoise_mask, model_options=model_options)
+
+    rows = []
+    for name, fn in (("legacy wrapper", run_legacy), ("dispatcher", run_current)):
+        result = measure(fn, repeat=args.repeat, warmup=args.warmup, device=device)
+        rows.append({"path": name,
+                     "device": str(device),
+                     "latent": "x".join(str(cur) for cur in shape),
+                     "steps": args.steps,
+                     "per step(us)": f"{result['median'] / args.steps * 1e6:.1f}"})
+    print_table(rows, ["path", "device", "latent", "steps", "per step(us)"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+productfix 성능 회귀 벤치마크 모음
+
+이미지 크기, 배치 크기 별로 주요 연산의 실행 시간을 측정하고 baseline 파일로 저장하거나 baseline과 비교합니다.
+baseline 비교는 측정 잡음이 적은 최소 실행 시간을 사용합니다.
+ComfyUI 없이 benchmarks/stubs의 대체 모듈로 CPU에서 실행할 수 있습니다.
+
+측정 항목:
+    detail_transfer    add_detail_transfer (마스크 있음)
+    dynamic_resize     dynamic_resize (lanczos, 1/2 크기)
+    simple_resize      simple_resize (1/2 크기)
+    rasterize          OCR 텍스트 영역 마스크 생성 (rasterize_polygons)
+    injection_step     latent injection dispatcher로 20 step 실행 (입력을 그대로 돌려주는 모델)
+    vq_encode          무작위 초기화한 작은 VQModel 인코딩
+    vq_decode          무작위 초기화한 작은 VQModel 디코딩
+
+사용 예:
+    python benchmarks/bench_suite.py --stubs --threads 4 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --stubs --threads 4 --compare benchmarks/baseline.json --threshold 0.15
+"""
+import os
+import sys
+import json
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import get_parser, load_productfix, import_module, measure, print_table
+
+CASES = ["detail_transfer", "dynamic_resize", "simple_resize", "rasterize", "injection_step", "vq_encode", "vq_decode"]
+
+def parse_int_list(text):
+    return [int(cur) for cur in text.split(",") if cur.strip()]
+
+def make_vq_model(seed=0):
+    """
+    벤치마크용 작은 VQModel (downscale 4, mid block attention 없음)을 무작위로 초기화합니다.
+    """
+    import torch
+    from diffusers.models.vq_model import VQModel
+
+    torch.manual_seed(seed)
+    vqmodel = VQModel(block_out_channels=(32, 32, 64), down_block_types=("DownEncoderBlock2D",) * 3,
+                      up_block_types=("UpDecoderBlock2D",) * 3, layers_per_block=1, latent_channels=4,
+                      num_vq_embeddings=256, norm_num_groups=16, mid_block_add_attention=False)
+    return vqmodel.eval()
+
+def make_polygons(batch_size, size, count=64, seed=0):
+    # 이미지별로 무작위 위치의 텍스트 박스 꼭짓점 리스트
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    polygons = []
+    for _ in range(batch_size):
+        boxes = []
+        for _ in range(count):
+            x, y = rng.uniform(0, size * 0.9, size=2)
+            w, h = rng.uniform(size * 0.02, size * 0.1), rng.uniform(size * 0.01, size * 0.04)
+            boxes.append([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+        polygons.append(boxes)
+    return polygons
+
+def build_case(name, size, batch_size, modules, steps=20):
+    """
+    name 항목을 size, batch_size로 측정할 함수를 반환합니다.
+    """
+    import torch
+
+    generator = torch.Generator().manual_seed(size * 100 + batch_size)
+    images = lambda: torch.rand((batch_size, size, size, 3), generator=generator)
+
+    if name == "detail_transfer":
+        target, source = images(), images()
+        mask = torch.zeros((batch_size, size, size))
+        mask[:, size // 4:size // 2, size // 8:size * 7 // 8] = 1
+        return lambda: modules["detail_transfer"].add_detail_transfer(target, source, 3.0, 0.7, mask)
+
+    if name == "dynamic_resize":
+        image = images()
+        pixels = (size // 2) ** 2
+        return lambda: modules["resize"].dynamic_resize(image, max_pixels=pixels, min_pixels=pixels // 4, method="lanczos")
+
+    if name == "simple_resize":
+        image = images().permute(0, 3, 1, 2)
+        return lambda: modules["utils"].simple_resize(image, size // 2, size // 2)
+
+    if name == "rasterize":
+        polygons = make_polygons(batch_size, size)
+        return lambda: modules["ocr"].rasterize_polygons(polygons, size, size, dtype=torch.float32)
+
+    if name == "injection_step":
+        from comfy.samplers import KSamplerX0Inpaint
+        from bench_latent_injection import TinyModel, TinyModelPatcher
+
+        shape = (batch_size, 4, size // 8, size // 8)
+        sigmas = torch.linspace(14.6, 0.0, steps + 1)
+        model = TinyModelPatcher()
+        modules["advanced_sampler"].set_latent_injection(model, 10.0, 0.4, True)
+        x = torch.randn(shape, generator=generator)
+        denoise_mask = (torch.rand((batch_size, 1) + shape[2:], generator=generator) > 0.5).float()
+
+        def run():
+            sampler = KSamplerX0Inpaint(TinyModel(), sigmas)
+            sampler.latent_image = torch.randn(shape, generator=generator)
+            sampler.noise = torch.randn(shape, generator=generator)
+            for sigma in sigmas[:-1]:
+                sampler(x, sigma.repeat(batch_size), denoise_mask, model_options=model.model_options)
+        return run
+
+    if name in ("vq_encode", "vq_decode"):
+        vq = modules["vq_model"]
+        image = images()
+        if name == "vq_encode":
+            return lambda: modules["vq"].vqmodel_encode(image, vq, tiled="disable")
+        latents = modules["vq"].vqmodel_encode(image, vq, tiled="disable")
+        return lambda: modules["vq"].vqmodel_decode(latents, vq, tiled="disable")
+
+    raise ValueError(f"unknown case: {name}")
+
+def get_environment():
+    import torch
+    return {"python": platform.python_version(), "torch": torch.__version__, "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(), "threads": torch.get_num_threads()}
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--cases", default=",".join(CASES), help="측정 항목 (쉼표로 구분)")
+    parser.add_argument("--sizes", default="256,512,1024", help="이미지 한 변의 크기 (쉼표로 구분)")
+    parser.add_argument("--batch-sizes", default="1,4", help="배치 크기 (쉼표로 구분)")
+    parser.add_argument("--vq-max-size", type=int, default=512, help="VQ 항목을 측정할 최대 이미지 크기")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU 스레드 수 (0이면 기본값)")
+    parser.add_argument("--save-baseline", default=None, help="측정 결과를 저장할 baseline JSON 경로")
+    parser.add_argument("--compare", default=None, help="비교할 baseline JSON 경로")
+    parser.add_argument("--threshold", type=float, default=0.2, help="baseline 대비 이 비율보다 느리면 회귀로 판단")
+    args = parser.parse_args()
+
+    load_productfix(args.comfyui, args.stubs)
+    import torch
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    cases = [cur.strip() for cur in args.cases.split(",") if cur.strip()]
+    modules = {name: import_module(name) for name in ("detail_transfer", "resize", "utils", "ocr", "advanced_sampler", "vq")}
+    if any(cur.startswith("vq_") for cur in cases):
+        modules["vq_model"] = modules["vq"].as_vq(make_vq_model())
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results, rows, regressions = {}, [], []
+    for name in cases:
+        for size in parse_int_list(args.sizes):
+            if name.startswith("vq_") and size > args.vq_max_size:
+                continue
+            for batch_size in parse_int_list(args.batch_sizes):
+                key = f"{name}/{size}/{batch_size}"
+                fn = build_case(name, size, batch_size, modules)
+                result = measure(fn, repeat=args.repeat, warmup=args.warmup)
+                results[key] = {"median": result["median"], "min": result["min"]}
+
+                row = {"case": name, "size": size, "batch": batch_size, "median(ms)": f"{result['median'] * 1e3:.2f}",
+                       "min(ms)": f"{result['min'] * 1e3:.2f}"}
+                if baseline is not None and key in baseline:
+                    ratio = result["min"] / baseline[key]["min"]
+                    row["baseline min(ms)"] = f"{baseline[key]['min'] * 1e3:.2f}"
+                    row["ratio"] = f"{ratio:.2f}"
+                    if ratio > 1 + args.threshold:
+                        row["status"] = "REGRESSION"
+                        regressions.append(key)
+                    else:
+                        row["status"] = "ok"
+                rows.append(row)
+
+    columns = ["case", "size", "batch", "median(ms)", "min(ms)"]
+    if baseline is not None:
+        columns += ["baseline min(ms)", "ratio", "status"]
+    print_table(rows, columns)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": get_environment(), "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"baseline is saved to {args.save_baseline}")
+
+    if len(regressions) > 0:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+GetTextMask 벤치마크: readtext_batched(검출 + 인식) 경로와 검출 전용 경로 비교
+
+사용 예:
+    python benchmarks/bench_text_mask.py --comfyui /path/to/ComfyUI --images ./product_shots --batch-size 8
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import (get_parser, load_productfix, import_module, measure, print_table,
+                    load_images, synthetic_product_images)
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--images", default=None, help="상품 이미지 디렉토리 (없으면 합성 이미지 사용)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--languages", default="en,ko")
+    args = parser.parse_args()
+
+    load_productfix(args.comfyui, args.stubs)
+    ocr = import_module("ocr")
+
+    if args.images is not None:
+        images = load_images(args.images, args.width, args.height, limit=args.batch_size)
+    else:
+        images = synthetic_product_images(args.batch_size, args.width, args.height)
+    languages = args.languages.split(",")
+
+    # 리더 로드 시간은 측정에서 제외
+    ocr.get_reader(languages, recognizer=True)
+
+    # 마스크 캐시를 사용하면 반복 측정이 모두 캐시 hit이 되고 models/productfix_cache에 파일이 남으므로 사용하지 않음
+    rows, masks = [], {}
+    for mode in ("readtext", "detect"):
+        result = measure(lambda: masks.__setitem__(mode, ocr.get_text_mask(images, languages, mode=mode, use_cache=False)),
+                         repeat=args.repeat, warmup=args.warmup)
+        rows.append({"mode": mode,
+                     "batch": images.shape[0],
+                     "size": f"{images.shape[2]}x{images.shape[1]}",
+                     "median(s)": f"{result['median']:.3f}",
+                     "per image(ms)": f"{result['median'] / images.shape[0] * 1000:.1f}"})
+
+    speedup = float(rows[0]["median(s)"]) / max(float(rows[1]["median(s)"]), 1e-9)
+    print_table(rows, ["mode", "batch", "size", "median(s)", "per image(ms)"])
+    print(f"\nspeedup (readtext / detect): {speedup:.2f}x")
+    print(f"identical masks: {bool((masks['readtext'] == masks['detect']).all())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+VQ 인코딩/디코딩 벤치마크: 기존 함수(autograd 활성, 전처리/후처리마다 임시 텐서 할당)와
+현재 실행 경로(inference mode, in-place 전처리/후처리, autocast, channels_last) 비교
+
+처리량(images/s)과 실행 중 최대 메모리 증가량을 출력합니다.
+(CUDA는 allocator 통계, CPU는 RSS 기준. CPU 측정을 위해 Linux에서는 MALLOC_MMAP_THRESHOLD_를 설정하여 다시 실행합니다)
+--ckpt를 지정하지 않으면 임의로 초기화한 작은 VQModel을 사용합니다.
+
+사용 예:
+    python benchmarks/bench_vq.py --comfyui /path/to/ComfyUI --device cuda --size 512 --batch-size 4
+    python benchmarks/bench_vq.py --comfyui /path/to/ComfyUI --ckpt /path/to/vq.pt
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import (get_parser, load_productfix, import_module, measure, measure_peak_memory, print_table,
+                    reexec_for_rss_measurement)
+
+def legacy_encode(images, vqmodel, device):
+    """
+    기존 vqmodel_encode (비교용)
+    """
+    images = (images * 2 - 1).permute(0, 3, 1, 2)
+    return vqmodel.encode(images.to(device=device, dtype=vqmodel.dtype))["latents"]
+
+def legacy_decode(latents, vqmodel, device):
+    """
+    기존 vqmodel_decode (비교용)
+    """
+    images = vqmodel.decode(latents.to(device=device, dtype=vqmodel.dtype), force_not_quantize=True)["sample"]
+    images = images * 0.5 + 0.5
+    images = images.clamp(0, 1)
+    return images.cpu().permute(0, 2, 3, 1).float()
+
+def make_random_vqmodel():
+    from diffusers.models.vq_model import VQModel
+    return VQModel(block_out_channels=(64, 128, 256), down_block_types=("DownEncoderBlock2D",) * 3,
+                   up_block_types=("UpDecoderBlock2D",) * 3, latent_channels=4, num_vq_embeddings=256,
+                   norm_num_groups=32, layers_per_block=1).eval()
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--device", default=None, help="실행 디바이스 (기본값: ComfyUI torch device)")
+    parser.add_argument("--ckpt", default=None, help="VQ 체크포인트 경로")
+    parser.add_argument("--size", type=int, default=256, help="이미지 한 변의 크기")
+    parser.add_argument("--batch-size", type=int, default=2)
+    args = parser.parse_args()
+
+    # CPU 최대 메모리를 RSS로 측정하기 위해 malloc 설정을 고정하고 다시 실행
+    reexec_for_rss_measurement()
+    load_productfix(args.comfyui, args.stubs)
+    import torch
+    from comfy import model_management
+    vq_module = import_module("vq")
+
+    vq = vq_module.load_vq_model(args.ckpt) if args.ckpt is not None else vq_module.VQ(make_random_vqmodel())
+    if args.device is not None:
+        vq.load_device = torch.device(args.device)
+        vq.patcher.load_device = vq.load_device
+    device = torch.device(vq.load_device)
+    model_management.load_models_gpu([vq.patcher])
+
+    images = torch.rand(args.batch_size, args.size, args.size, 3)
+    # inference mode에서 만든 텐서는 autograd가 활성화된 기존 함수에 넣을 수 없으므로 복사
+    latents = vq_module.vqmodel_encode(images, vq, tiled="disable").clone()
+
+    configs = [("legacy", None)]
+    configs += [("current", {"precision": "default", "channels_last": False}),
+                ("channels_last", {"precision": "default", "channels_last": True})]
+    for precision in ("bf16", "fp16"):
+        if device.type == "cpu" and precision == "fp16":
+            continue
+        configs.append((precision, {"precision": precision, "channels_last": False}))
+        configs.append((f"{precision} + channels_last", {"precision": precision, "channels_last": True}))
+
+    rows = []
+    for name, options in configs:
+        if options is None:
+            vq.set_memory_format(False)
+            encode = lambda: legacy_encode(images, vq.model, device)
+            decode = lambda: legacy_decode(latents, vq.model, device)
+        else:
+            encode = lambda: vq_module.vqmodel_encode(images, vq, tiled="disable", **options)
+            decode = lambda: vq_module.vqmodel_decode(latents, vq, tiled="disable", **options)
+
+        for stage, fn in (("encode", encode), ("decode", decode)):
+            result = measure(fn, repeat=args.repeat, warmup=args.warmup, device=device)
+            peak = measure_peak_memory(fn, device=device)
+            rows.append({"path": name,
+                         "stage": stage,
+                         "device": str(device),
+                         "images": f"{args.batch_size}x{args.size}x{args.size}",
+                         "median(ms)": f"{result['median'] * 1e3:.1f}",
+                         "images/s": f"{args.batch_size / result['median']:.2f}",
+                         "peak(MB)": f"{peak / 1024**2:.1f}" if peak is not None else "-"})
+    print_table(rows, ["path", "stage", "device", "images", "median(ms)", "images/s", "peak(MB)"])
+
+if __name__ == "__main__":
+    main()
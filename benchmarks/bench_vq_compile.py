@@ -0,0 +1,70 @@
+"""
+VQ compile 실행 벤치마크: eager와 torch.compile (bucket padding) 실행 비교
+
+DynamicImageResize가 만드는 것과 같은 여러 해상도에서 인코딩/디코딩 처리량(images/s)과
+첫 실행(compile 포함) 시간, eager 결과와의 최대 차이를 출력합니다.
+같은 bucket에 들어가는 해상도는 compile 결과를 공유하므로 두 번째부터는 첫 실행 시간이 짧습니다.
+--ckpt를 지정하지 않으면 임의로 초기화한 작은 VQModel을 사용합니다.
+
+사용 예:
+    python benchmarks/bench_vq_compile.py --stubs --shapes 512x512,448x576,576x448 --batch-size 2
+    python benchmarks/bench_vq_compile.py --comfyui /path/to/ComfyUI --ckpt /path/to/vq.pt --precision bf16
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import get_parser, load_productfix, import_module, measure, print_table, synchronize
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--ckpt", default=None, help="VQ 체크포인트 경로")
+    parser.add_argument("--shapes", default="512x512,448x576,576x448,500x500", help="이미지 크기 (높이x너비, 쉼표로 구분)")
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--precision", default="default")
+    args = parser.parse_args()
+
+    load_productfix(args.comfyui, args.stubs)
+    import torch
+    vq_module = import_module("vq")
+    vq_compile = import_module("vq_compile")
+    from bench_vq import make_random_vqmodel
+
+    vq = vq_module.load_vq_model(args.ckpt) if args.ckpt is not None else vq_module.VQ(make_random_vqmodel())
+    device = vq.load_device
+    shapes = [tuple(int(cur) for cur in shape.split("x")) for shape in args.shapes.split(",") if shape.strip()]
+
+    rows = []
+    for height, width in shapes:
+        images = torch.rand((args.batch_size, height, width, 3))
+        options = {"tiled": "disable", "precision": args.precision}
+        encode = lambda compiled: vq_module.vqmodel_encode(images, vq, compiled=compiled, **options)
+        latents = encode(False)
+        decode = lambda compiled: vq_module.vqmodel_decode(latents, vq, compiled=compiled, **options)
+
+        for name, fn in (("encode", encode), ("decode", decode)):
+            eager = measure(lambda: fn(False), repeat=args.repeat, warmup=args.warmup, device=device)
+
+            # 첫 실행 (해당 bucket을 처음 사용하면 compile 포함)
+            start = time.perf_counter()
+            compiled_out = fn(True)
+            synchronize(device)
+            first = time.perf_counter() - start
+            compiled = measure(lambda: fn(True), repeat=args.repeat, warmup=0, device=device)
+
+            bucket = vq_compile.get_bucket_shape(height, width, vq_compile.COMPILE_BUCKET)
+            rows.append({"op": name,
+                         "shape": f"{args.batch_size}x{height}x{width}",
+                         "bucket": "x".join(str(cur) for cur in bucket),
+                         "eager(img/s)": f"{args.batch_size / eager['median']:.2f}",
+                         "compiled(img/s)": f"{args.batch_size / compiled['median']:.2f}",
+                         "speedup": f"{eager['median'] / compiled['median']:.2f}x",
+                         "first call(s)": f"{first:.2f}",
+                         "max diff": f"{(compiled_out.float() - fn(False).float()).abs().max().item():.2e}"})
+
+    print_table(rows, list(rows[0].keys()))
+    print(vq_compile.get_compile_stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+디테일 전송 sparse 경로 검증: 마스크 영역 crop만 계산한 결과(_transfer_sparse)가 전체를 계산한 결과(_transfer)와 같은지 확인
+
+separable 블러는 crop과 전체 이미지에서 같은 순서로 계산하므로 결과가 완전히 같아야 하고,
+FFT 블러는 FFT 크기에 따라 반올림 오차가 달라지므로 --fft-tolerance 이내인지 확인합니다.
+이미지 경계에 닿는 마스크, 부드러운 (feather) 마스크, 배치 크기 1인 소스/마스크 broadcast를 포함합니다.
+잠재 공간 디테일 전송(latent_detail_transfer)은 이미지 해상도 마스크를 잠재 크기로 줄여 전체를 계산한 결과와 비교합니다.
+하나라도 다르면 종료 코드 1을 반환합니다.
+
+사용 예:
+    python benchmarks/check_detail_transfer.py --stubs
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import get_parser, load_productfix, import_module, print_table
+
+def make_masks(batch_size, height, width):
+    """
+    (이름, 마스크 (B 또는 1, 1, H, W)) 검증용 마스크 목록을 반환합니다.
+    """
+    import torch
+
+    interior = torch.zeros((batch_size, 1, height, width))
+    interior[:, :, height // 4:height // 3, width // 5:width // 2] = 1
+    interior[-1, :, height // 2:height // 2 + 7, width // 2:width - 20] = 1
+
+    # 위/왼쪽 모서리, 오른쪽/아래쪽 경계에 닿는 영역
+    border = torch.zeros((batch_size, 1, height, width))
+    border[:, :, :height // 6, :width // 5] = 1
+    border[:, :, height // 2:, width - 9:] = 1
+    border[0, :, height - 3:, width // 3:width // 2] = 1
+
+    # 경계가 부드러운 마스크 (0보다 큰 값은 모두 영역으로 취급)
+    soft = interior.clone()
+    soft[:, :, height // 4 - 4:height // 4, width // 5:width // 2] = 0.25
+
+    # 배치 크기 1 마스크 (모든 항목에 broadcast)
+    single = border[:1].clone()
+    return [("interior", interior), ("border", border), ("soft", soft), ("broadcast mask", single)]
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--size", default="96x128", help="이미지 크기 (높이x너비)")
+    parser.add_argument("--batch-size", type=int, default=3)
+    parser.add_argument("--fft-tolerance", type=float, default=1e-5, help="FFT 블러 결과의 허용 오차")
+    args = parser.parse_args()
+
+    load_productfix(args.comfyui, args.stubs)
+    import torch
+    dt = import_module("detail_transfer")
+    utils = import_module("utils")
+
+    height, width = (int(cur) for cur in args.size.split("x"))
+    generator = torch.Generator().manual_seed(0)
+    target = torch.rand((args.batch_size, 3, height, width), generator=generator)
+    sources = {"source": torch.rand((args.batch_size, 3, height, width), generator=generator),
+               "broadcast source": torch.rand((1, 3, height, width), generator=generator)}
+    # (방법, 블러) FFT는 "auto"에서 FFT가 선택되는 큰 커널과 작은 커널 모두 확인
+    blurs = [("separable", 1.0), ("separable", 3.0), ("fft", 2.0), ("auto", 6.0)]
+
+    rows, failures = [], 0
+    for mask_name, mask in make_masks(args.batch_size, height, width):
+        for source_name, source in sources.items():
+            for method, blur in blurs:
+                pad = dt.get_kernel_size(blur) // 2
+                regions = dt.get_mask_regions(utils.repeat_to_batch(mask, args.batch_size), pad)
+                dense = dt._transfer(target, source, blur, 0.8, mask, method)
+                sparse = dt._transfer_sparse(target, source, blur, 0.8, mask, method, regions, pad)
+
+                diff = (dense - sparse).abs().max().item()
+                fft = method == "fft" or (method == "auto" and dt.get_kernel_size(blur) > dt.FFT_KERNEL_SIZE)
+                ok = diff <= args.fft_tolerance if fft else torch.equal(dense, sparse)
+                failures += int(not ok)
+                rows.append({"mask": mask_name, "source": source_name, "method": method, "blur": blur,
+                             "regions": sum(len(cur) for cur in regions), "max diff": f"{diff:.2e}",
+                             "status": "ok" if ok else "MISMATCH"})
+
+    # 잠재 공간: latent_detail_transfer (마스크 영역이 작으면 sparse 경로)와 전체 계산 비교
+    masks_py = import_module("masks")
+    latent_h, latent_w = height // 2, width // 2
+    latent_target = torch.randn((args.batch_size, 4, latent_h, latent_w), generator=generator)
+    latent_sources = {"source": torch.randn((args.batch_size, 4, latent_h, latent_w), generator=generator),
+                      "broadcast source": torch.randn((1, 4, latent_h, latent_w), generator=generator)}
+    sparse_calls = []
+    transfer_sparse = dt._transfer_sparse
+    dt._transfer_sparse = lambda *inputs: sparse_calls.append(1) or transfer_sparse(*inputs)
+    try:
+        for mask_name, mask in make_masks(args.batch_size, height, width):
+            for source_name, source in latent_sources.items():
+                for method, blur in blurs[:2]:
+                    sparse_calls.clear()
+                    result = dt.latent_detail_transfer(latent_target, source, blur, 0.8, mask, method)
+                    latent_mask = masks_py.prepare_mask(mask, latent_h, latent_w, latent_target.device, latent_target.dtype)
+                    dense = dt._transfer(latent_target, source, blur, 0.8, latent_mask, method)
+
+                    diff = (dense - result).abs().max().item()
+                    ok = torch.equal(dense, result)
+                    failures += int(not ok)
+                    rows.append({"mask": f"latent {mask_name}", "source": source_name, "method": method, "blur": blur,
+                                 "regions": "sparse" if sparse_calls else "dense", "max diff": f"{diff:.2e}",
+                                 "status": "ok" if ok else "MISMATCH"})
+    finally:
+        dt._transfer_sparse = transfer_sparse
+
+    print_table(rows, list(rows[0].keys()))
+    if failures > 0:
+        print(f"{failures} case(s) differ between sparse and dense detail transfer")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+벤치마크 공통 유틸리티
+
+ComfyUI 밖에서 productfix 모듈을 불러오고, 실행 시간을 측정하는 함수들을 제공합니다.
+ComfyUI 경로는 --comfyui 인자 또는 COMFYUI_DIR 환경 변수로 지정합니다.
+ComfyUI가 없으면 (또는 --stubs) benchmarks/stubs의 대체 모듈로 CPU에서 실행합니다.
+"""
+import os
+import sys
+import time
+import types
+import argparse
+import importlib
+import importlib.util
+import threading
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+PACKAGE_NAME = "productfix"
+
+def get_parser(description):
+    """
+    모든 벤치마크가 공유하는 기본 인자 파서를 반환합니다.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--comfyui", default=os.environ.get("COMFYUI_DIR", None), help="ComfyUI 설치 경로")
+    parser.add_argument("--stubs", action="store_true", help="ComfyUI 대신 benchmarks/stubs의 대체 모듈 사용 (CPU)")
+    parser.add_argument("--repeat", type=int, default=5, help="측정 반복 횟수")
+    parser.add_argument("--warmup", type=int, default=1, help="측정 전 워밍업 횟수")
+    return parser
+
+def load_productfix(comfyui_dir=None, stubs=False):
+    """
+    __init__.py(노드 등록)를 실행하지 않고 productfix 패키지를 등록합니다.
+    이후 import_module("ocr") 처럼 하위 모듈을 상대 import 그대로 불러올 수 있습니다.
+    stubs가 True이거나 ComfyUI 경로가 없고 comfy 모듈을 찾을 수 없으면 benchmarks/stubs의 대체 모듈을 사용합니다.
+    """
+    if comfyui_dir is not None and comfyui_dir not in sys.path:
+        sys.path.insert(0, os.path.abspath(comfyui_dir))
+    elif stubs or importlib.util.find_spec("comfy") is None:
+        if STUBS_DIR not in sys.path:
+            sys.path.insert(0, STUBS_DIR)
+
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [REPO_DIR]
+        sys.modules[PACKAGE_NAME] = package
+    return sys.modules[PACKAGE_NAME]
+
+def import_module(name):
+    """
+    productfix 하위 모듈을 불러옵니다.
+    """
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+def synchronize(device=None):
+    """
+    비동기 디바이스의 작업이 끝날 때까지 기다립니다.
+    """
+    import torch
+    if device is None:
+        return
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+def measure(fn, repeat=5, warmup=1, device=None):
+    """
+    함수 실행 시간을 측정합니다.
+
+    Returns:
+        dict: 평균, 중앙값, 최소 실행 시간 (초)
+    """
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+
+    return {"mean": statistics.mean(times), "median": statistics.median(times), "min": min(times)}
+
+def reexec_for_rss_measurement():
+    """
+    glibc malloc은 해제한 큰 메모리를 재사용하려고 OS에 돌려주지 않아서 RSS로는 최대 메모리를 측정할 수 없습니다.
+    MALLOC_MMAP_THRESHOLD_를 고정한 환경에서 현재 스크립트를 다시 실행합니다. (Linux에서만, 이미 설정된 경우 그대로 진행)
+    """
+    if sys.platform.startswith("linux") and "MALLOC_MMAP_THRESHOLD_" not in os.environ:
+        env = dict(os.environ, MALLOC_MMAP_THRESHOLD_="131072")
+        os.execve(sys.executable, [sys.executable] + sys.argv, env)
+
+def _current_rss():
+    # 현재 프로세스 RSS (byte, Linux /proc 기준)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def measure_peak_memory(fn, device=None):
+    """
+    함수 실행 중 늘어난 최대 메모리를 측정합니다.
+    CUDA는 allocator 통계를, CPU는 RSS를 주기적으로 샘플링한 값을 사용합니다. (Linux에서만 가능, 그 외에는 None)
+    CPU에서는 reexec_for_rss_measurement()로 다시 실행한 프로세스에서 측정해야 정확합니다.
+
+    Returns:
+        int | None: 실행 전 대비 최대 메모리 증가량 (byte)
+    """
+    import torch
+    device = torch.device(device) if device is not None else torch.device("cpu")
+    if device.type == "cuda":
+        synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+        fn()
+        synchronize(device)
+        return torch.cuda.max_memory_allocated(device) - baseline
+
+    if not os.path.exists("/proc/self/statm"):
+        fn()
+        return None
+
+    baseline = _current_rss()
+    peak = [baseline]
+    done = threading.Event()
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], _current_rss())
+            done.wait(0.001)
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        fn()
+        synchronize(device)
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak[0], _current_rss()) - baseline
+
+def print_table(rows, columns):
+    """
+    측정 결과를 표 형식으로 출력합니다.
+    """
+    widths = [max(len(str(col)), *(len(str(row.get(col, ""))) for row in rows)) for col in columns]
+    print("  ".join(str(col).ljust(width) for col, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(str(row.get(col, "")).ljust(width) for col, width in zip(columns, widths)))
+
+def load_images(image_dir, width, height, limit=None):
+    """
+    디렉토리의 이미지들을 같은 크기로 불러와 ComfyUI IMAGE 배치 (B, H, W, C)로 반환합니다.
+    """
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    extensions = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+    files = sorted(cur for cur in os.listdir(image_dir) if cur.lower().endswith(extensions))[:limit]
+    images = []
+    for file in files:
+        image = Image.open(os.path.join(image_dir, file)).convert("RGB").resize((width, height), Image.LANCZOS)
+        images.append(torch.from_numpy(np.asarray(image, dtype=np.float32) / 255.0))
+    return torch.stack(images)
+
+def synthetic_product_images(batch_size, width, height, seed=0):
+    """
+    텍스트가 인쇄된 상품 이미지를 흉내낸 합성 이미지 배치를 생성합니다.
+    """
+    import cv2
+    import numpy as np
+    import torch
+
+    rng = np.random.default_rng(seed)
+    words = ["PRODUCT", "ORGANIC", "500ml", "SHAMPOO", "Natural", "NET WT 12oz", "Since 1984"]
+    images = []
+    for _ in range(batch_size):
+        image = np.full((height, width, 3), rng.integers(180, 255, size=3), dtype=np.uint8)
+        for _ in range(rng.integers(4, 12)):
+            org = (int(rng.integers(0, width * 3 // 4)), int(rng.integers(20, height)))
+            scale = float(rng.uniform(0.5, 2.0)) * width / 512
+            color = tuple(int(cur) for cur in rng.integers(0, 120, size=3))
+            cv2.putText(image, str(rng.choice(words)), org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, max(1, int(scale * 2)))
+        images.append(torch.from_numpy(image.astype(np.float32) / 255.0))
+    return torch.stack(images)
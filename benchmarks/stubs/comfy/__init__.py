@@ -0,0 +1,6 @@
+"""
+벤치마크용 ComfyUI 대체 모듈
+
+ComfyUI 없이 CPU에서 productfix 벤치마크를 실행할 수 있도록 productfix가 사용하는 API만 가볍게 구현합니다.
+실제 ComfyUI가 있으면 --comfyui 인자로 실제 모듈을 사용하세요.
+"""
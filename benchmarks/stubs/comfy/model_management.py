@@ -0,0 +1,42 @@
+"""
+comfy.model_management 대체 모듈 (CPU 전용)
+
+모든 모델과 텐서는 CPU에 있으며, 사용 가능한 메모리는 PRODUCTFIX_BENCH_FREE_MEMORY_MB(기본값: 8192)로 고정합니다.
+"""
+import os
+import torch
+
+VAE_DTYPES = [torch.float32]
+OOM_EXCEPTION = torch.cuda.OutOfMemoryError
+
+FREE_MEMORY = int(float(os.environ.get("PRODUCTFIX_BENCH_FREE_MEMORY_MB", 8192)) * 1024**2)
+
+def get_torch_device():
+    return torch.device("cpu")
+
+def intermediate_device():
+    return torch.device("cpu")
+
+def unet_offload_device():
+    return torch.device("cpu")
+
+def vae_offload_device():
+    return torch.device("cpu")
+
+def get_free_memory(dev=None, torch_free_too=False):
+    if torch_free_too:
+        return (FREE_MEMORY, FREE_MEMORY)
+    return FREE_MEMORY
+
+def dtype_size(dtype):
+    return torch.empty((), dtype=dtype).element_size()
+
+def soft_empty_cache(force=False):
+    pass
+
+def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+    for model in models:
+        model.patch_model(model.load_device)
+
+def load_model_gpu(model):
+    return load_models_gpu([model])
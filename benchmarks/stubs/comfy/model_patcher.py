@@ -0,0 +1,41 @@
+"""
+comfy.model_patcher 대체 모듈 (모델과 디바이스, model_options만 유지)
+
+ComfyUI ModelPatcher와 같이 모델 객체에 device 등의 속성을 설정하므로
+속성을 설정할 수 없는 모델(diffusers ModelMixin의 device property 등)은 ComfyUI에서와 같이 실패합니다.
+"""
+import copy
+
+class ModelPatcher:
+    def __init__(self, model, load_device, offload_device, size=0, weight_inplace_update=False):
+        self.model = model
+        self.load_device = load_device
+        self.offload_device = offload_device
+        self.size = size
+        self.model_options = {"transformer_options": {}}
+        if not hasattr(self.model, "model_loaded_weight_memory"):
+            self.model.model_loaded_weight_memory = 0
+        if not hasattr(self.model, "model_lowvram"):
+            self.model.model_lowvram = False
+
+    def patch_model(self, device_to=None, lowvram_model_memory=0, load_weights=True, force_patch_weights=False):
+        if device_to is not None:
+            self.model.to(device_to)
+            self.model.device = device_to
+        return self.model
+
+    def unpatch_model(self, device_to=None, unpatch_weights=True):
+        if device_to is not None:
+            self.model.to(device_to)
+            self.model.device = device_to
+
+    def clone(self):
+        patcher = ModelPatcher(self.model, self.load_device, self.offload_device, self.size)
+        patcher.model_options = copy.deepcopy(self.model_options)
+        return patcher
+
+    def model_size(self):
+        return self.size
+
+    def calculate_weight(self, patches, weight, key, intermediate_dtype=None):
+        return weight
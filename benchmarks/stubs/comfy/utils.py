@@ -0,0 +1,77 @@
+"""
+comfy.utils 대체 모듈 (lanczos, tiled_scale, ProgressBar)
+"""
+import math
+import itertools
+import numpy as np
+import torch
+from PIL import Image
+
+def lanczos(samples, width, height):
+    # ComfyUI와 같이 PIL LANCZOS로 리사이즈 (B, C, H, W)
+    images = [Image.fromarray(np.clip(255. * image.movedim(0, -1).cpu().numpy(), 0, 255).astype(np.uint8)) for image in samples]
+    images = [image.resize((width, height), resample=Image.Resampling.LANCZOS) for image in images]
+    images = [torch.from_numpy(np.array(image).astype(np.float32) / 255.0).movedim(-1, 0) for image in images]
+    return torch.stack(images).to(samples.device, samples.dtype)
+
+class ProgressBar:
+    def __init__(self, total):
+        self.total = total
+        self.current = 0
+
+    def update_absolute(self, value, total=None, preview=None):
+        if total is not None:
+            self.total = total
+        self.current = min(value, self.total)
+
+    def update(self, value):
+        self.update_absolute(self.current + value)
+
+def get_tiled_scale_steps(width, height, tile_x, tile_y, overlap):
+    rows = 1 if height <= tile_y else math.ceil((height - overlap) / (tile_y - overlap))
+    cols = 1 if width <= tile_x else math.ceil((width - overlap) / (tile_x - overlap))
+    return rows * cols
+
+@torch.inference_mode()
+def tiled_scale(samples, function, tile_x=64, tile_y=64, overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", pbar=None):
+    # 겹치는 tile 단위로 function을 실행하고 겹치는 영역은 feather blending
+    tile = (tile_y, tile_x)
+    output = torch.empty([samples.shape[0], out_channels] + [round(cur * upscale_amount) for cur in samples.shape[2:]], device=output_device)
+    for b in range(samples.shape[0]):
+        sample = samples[b:b + 1]
+        if all(sample.shape[d + 2] <= tile[d] for d in range(2)):
+            output[b:b + 1] = function(sample).to(output_device)
+            if pbar is not None:
+                pbar.update(1)
+            continue
+
+        out = torch.zeros([1, out_channels] + [round(cur * upscale_amount) for cur in sample.shape[2:]], device=output_device)
+        out_div = torch.zeros_like(out)
+        positions = [range(0, sample.shape[d + 2] - overlap, tile[d] - overlap) if sample.shape[d + 2] > tile[d] else [0] for d in range(2)]
+        for position in itertools.product(*positions):
+            crop, upscaled = sample, []
+            for d in range(2):
+                start = max(0, min(sample.shape[d + 2] - overlap, position[d]))
+                length = min(tile[d], sample.shape[d + 2] - start)
+                crop = crop.narrow(d + 2, start, length)
+                upscaled.append(round(start * upscale_amount))
+            result = function(crop).to(output_device)
+
+            mask = torch.ones_like(result)
+            feather = round(overlap * upscale_amount)
+            for t in range(feather):
+                for d in range(2, 4):
+                    alpha = (t + 1) / feather
+                    mask.narrow(d, t, 1).mul_(alpha)
+                    mask.narrow(d, mask.shape[d] - 1 - t, 1).mul_(alpha)
+
+            out_crop, div_crop = out, out_div
+            for d in range(2):
+                out_crop = out_crop.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+                div_crop = div_crop.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+            out_crop += result * mask
+            div_crop += mask
+            if pbar is not None:
+                pbar.update(1)
+        output[b:b + 1] = out / out_div
+    return output
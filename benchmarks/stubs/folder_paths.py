@@ -0,0 +1,36 @@
+"""
+folder_paths 대체 모듈
+
+모델 디렉토리는 PRODUCTFIX_BENCH_MODELS_DIR(기본값: 임시 디렉토리의 productfix_bench/models)를 사용합니다.
+"""
+import os
+import tempfile
+
+base_path = os.environ.get("PRODUCTFIX_BENCH_DIR", os.path.join(tempfile.gettempdir(), "productfix_bench"))
+models_dir = os.environ.get("PRODUCTFIX_BENCH_MODELS_DIR", os.path.join(base_path, "models"))
+
+def get_folder_paths(folder_name):
+    return [os.path.join(models_dir, folder_name)]
+
+def get_filename_list(folder_name):
+    files = []
+    for folder in get_folder_paths(folder_name):
+        for root, _, names in os.walk(folder, followlinks=True):
+            files += [os.path.relpath(os.path.join(root, name), folder) for name in names]
+    return sorted(set(files))
+
+def get_full_path(folder_name, filename):
+    for folder in get_folder_paths(folder_name):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def get_temp_directory():
+    return os.path.join(base_path, "temp")
+
+def get_output_directory():
+    return os.path.join(base_path, "output")
+
+def get_input_directory():
+    return os.path.join(base_path, "input")
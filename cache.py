@@ -0,0 +1,214 @@
+import os
+import logging
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+import torch
+import numpy as np
+import folder_paths
+
+def get_cache_dir(name: str):
+    """
+    productfix 캐시 디렉토리를 반환합니다.
+    PRODUCTFIX_CACHE_DIR 환경 변수로 위치를 바꿀 수 있습니다. (기본값: models/productfix_cache)
+    """
+    root = os.environ.get("PRODUCTFIX_CACHE_DIR", os.path.join(folder_paths.models_dir, "productfix_cache"))
+    return os.path.join(root, name)
+
+def tensor_digest(tensor: torch.Tensor):
+    """
+    텐서의 shape, dtype, 데이터로 content digest(blake2b 128bit)를 계산합니다.
+    """
+    tensor = tensor.detach().to("cpu").contiguous()
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{tuple(tensor.shape)}:{tensor.dtype}".encode())
+    hasher.update(tensor.reshape(-1).view(torch.uint8).numpy().data)
+    return hasher.hexdigest()
+
+def make_key(*parts):
+    """
+    digest와 설정값들을 조합하여 캐시 키를 만듭니다.
+    """
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+def tensor_nbytes(tensor: torch.Tensor):
+    return tensor.numel() * tensor.element_size()
+
+class TensorStore:
+    """
+    content-addressed 텐서 캐시 (메모리 + 디스크 2단계)
+
+    메모리와 디스크 모두 용량 제한이 있으며, 가장 오래 사용되지 않은 항목부터 제거합니다. (LRU)
+    디스크 형식(codec)은 다음 중 하나입니다.
+        "bits": 0/1 마스크를 np.packbits로 압축하여 .npz로 저장
+        "npy": .npy로 저장하고 memory-map으로 불러옴 (zero-copy)
+    """
+    def __init__(self, name: str, directory: str = None, memory_limit: int = 256 * 1024**2, disk_limit: int = 1024**3, codec: str = "npy"):
+        self.name = name
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit if directory is not None else 0
+        self.codec = codec
+        self.extension = ".npz" if codec == "bits" else ".npy"
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0,
+                       "memory_evictions": 0, "disk_evictions": 0}
+
+    # 디스크 인덱스는 첫 사용 시 디렉토리를 스캔하여 만듦
+    def _disk_index(self):
+        if self._disk is None:
+            self._disk = OrderedDict()
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(self.extension):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(self.extension)], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+        return self._disk
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.extension)
+
+    def _remember(self, key, tensor):
+        nbytes = tensor_nbytes(tensor)
+        if nbytes > self.memory_limit:
+            return
+        # 큰 배치 텐서의 view라면 배치 전체가 메모리에 남지 않도록 복사
+        if tensor.untyped_storage().nbytes() > nbytes:
+            tensor = tensor.clone()
+        if key in self._memory:
+            self._memory_bytes -= tensor_nbytes(self._memory.pop(key))
+        self._memory[key] = tensor
+        self._memory_bytes += nbytes
+        while self._memory_bytes > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= tensor_nbytes(evicted)
+            self._stats["memory_evictions"] += 1
+
+    def _save(self, path, tensor):
+        # 임시 파일에 쓴 뒤 교체하여 중간에 중단되어도 깨진 파일이 남지 않도록 함
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            if self.codec == "bits":
+                array = tensor.to("cpu").numpy().astype(bool)
+                np.savez(f, bits=np.packbits(array.reshape(-1)), shape=np.asarray(array.shape))
+            else:
+                np.save(f, tensor.to("cpu").numpy())
+        os.replace(tmp_path, path)
+
+    def _load(self, path):
+        if self.codec == "bits":
+            with np.load(path) as data:
+                shape = tuple(data["shape"])
+                array = np.unpackbits(data["bits"], count=int(np.prod(shape))).reshape(shape)
+            return torch.from_numpy(array.astype(bool))
+        array = np.load(path, mmap_mode="r")
+        with warnings.catch_warnings():
+            # 읽기 전용 memory-map 이므로 in-place 수정하지 않는 한 안전함
+            warnings.simplefilter("ignore", UserWarning)
+            return torch.from_numpy(array)
+
+    def get(self, key: str):
+        """
+        캐시된 텐서를 반환합니다. 없으면 None을 반환합니다.
+        """
+        with self._lock:
+            tensor = self._memory.get(key, None)
+            if tensor is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return tensor
+
+            if self.disk_limit > 0 and key in self._disk_index():
+                path = self._path(key)
+                try:
+                    tensor = self._load(path)
+                    os.utime(path)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"[middlek cache] {self.name}: failed to read {path}: {e}")
+                    self._disk_bytes -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._stats["disk_hits"] += 1
+                    self._remember(key, tensor)
+                    return tensor
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, tensor: torch.Tensor):
+        """
+        텐서를 메모리 캐시와 디스크 캐시에 저장합니다.
+        """
+        tensor = tensor.detach()
+        with self._lock:
+            self._stats["puts"] += 1
+            self._remember(key, tensor)
+
+            if self.disk_limit <= 0:
+                return
+            disk = self._disk_index()
+            path = self._path(key)
+            try:
+                self._save(path, tensor)
+            except OSError as e:
+                logging.warning(f"[middlek cache] {self.name}: failed to write {path}: {e}")
+                return
+            if key in disk:
+                self._disk_bytes -= disk.pop(key)
+            disk[key] = os.path.getsize(path)
+            self._disk_bytes += disk[key]
+
+            while self._disk_bytes > self.disk_limit and len(disk) > 1:
+                evicted_key, size = disk.popitem(last=False)
+                self._disk_bytes -= size
+                self._stats["disk_evictions"] += 1
+                try:
+                    os.remove(self._path(evicted_key))
+                except OSError:
+                    pass
+
+    def clear(self, disk: bool = False):
+        """
+        메모리 캐시를 비웁니다. disk=True면 디스크 캐시 파일도 삭제합니다.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if disk and self.disk_limit > 0:
+                for key in list(self._disk_index().keys()):
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+                self._disk.clear()
+                self._disk_bytes = 0
+
+    def stats(self):
+        """
+        hit/miss 횟수, hit rate, 사용 중인 용량을 반환합니다.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups > 0 else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_entries"] = len(self._disk) if self._disk is not None else None
+            stats["disk_bytes"] = self._disk_bytes if self._disk is not None else None
+        return stats
+
+def env_megabytes(name: str, default: int):
+    """
+    MB 단위 환경 변수를 byte로 변환하여 반환합니다.
+    """
+    return int(float(os.environ.get(name, default)) * 1024**2)
@@ -0,0 +1,79 @@
+import logging
+from typing import Callable
+import torch
+from comfy import model_management
+
+from . import profiling
+
+def get_chunk_size(batch_size: int, memory_per_item: int, device: torch.device):
+    """
+    사용 가능한 메모리(model_management.get_free_memory)에 들어가는 배치 chunk 크기를 계산합니다.
+
+    Args:
+        batch_size (int): 전체 배치 크기
+        memory_per_item (int): 배치 항목 하나를 처리하는 데 필요한 메모리 추정치 (byte)
+        device (torch.device): 실행 디바이스
+
+    Returns:
+        int: 1 이상 batch_size 이하의 chunk 크기
+    """
+    free_memory = model_management.get_free_memory(device)
+    return min(max(batch_size, 1), max(1, int(free_memory / max(1, memory_per_item))))
+
+def batch_slice(tensor: torch.Tensor, start: int, end: int, batch_size: int):
+    """
+    배치 크기 batch_size 기준으로 [start, end) 구간에 해당하는 항목을 반환합니다.
+    배치 크기가 1이면 그대로 반환하고 (broadcast), 다르면 repeat_to_batch와 같이 반복한 항목을 선택합니다.
+    """
+    if tensor is None or tensor.shape[0] == 1:
+        return tensor
+    if tensor.shape[0] == batch_size:
+        return tensor[start:end]
+    return tensor[torch.arange(start, end, device=tensor.device) % tensor.shape[0]]
+
+def run_chunked(fn: Callable, batch_size: int, memory_per_item: int, device: torch.device, out: torch.Tensor = None,
+                output_device: torch.device = None, name: str = "productfix"):
+    """
+    배치를 메모리에 맞는 chunk로 나누어 fn을 실행하고 결과를 미리 할당한 출력 텐서에 채웁니다.
+    메모리가 부족하면 (OOM) chunk 크기를 절반으로 줄여서 같은 위치부터 다시 실행하며,
+    줄인 chunk 크기는 남은 배치에도 그대로 사용합니다.
+
+    Args:
+        fn (Callable): fn(start, end)로 [start, end) 항목의 결과 텐서 (end - start, ...)를 반환하는 함수
+        batch_size (int): 전체 배치 크기
+        memory_per_item (int): 배치 항목 하나를 처리하는 데 필요한 메모리 추정치 (byte)
+        device (torch.device): fn을 실행하는 디바이스 (사용 가능한 메모리 기준)
+        out (torch.Tensor, optional): 결과를 채울 (batch_size, ...) 텐서 (없으면 첫 번째 chunk 결과의 크기, dtype으로 할당)
+        output_device (torch.device, optional): out을 새로 할당할 디바이스 (기본값: intermediate device)
+        name (str): 로그에 표시할 작업 이름
+
+    Returns:
+        torch.Tensor: 결과 텐서 (batch_size, ...)
+    """
+    chunk_size = get_chunk_size(batch_size, memory_per_item, device)
+    start = 0
+    while start < batch_size:
+        end = min(start + chunk_size, batch_size)
+        try:
+            chunk = fn(start, end)
+        except model_management.OOM_EXCEPTION:
+            if end - start == 1:
+                raise
+            chunk = None
+
+        if chunk is None:
+            # except 밖에서 정리하여 실패한 chunk의 텐서가 traceback에 남지 않도록 함
+            chunk_size = max(1, (end - start) // 2)
+            logging.warning(f"[middlek {name}] Ran out of memory with batch chunk {end - start}, retrying with {chunk_size}.")
+            model_management.soft_empty_cache()
+            continue
+
+        if out is None:
+            if output_device is None:
+                output_device = model_management.intermediate_device()
+            out = torch.empty((batch_size,) + tuple(chunk.shape[1:]), dtype=chunk.dtype, device=output_device)
+        profiling.record_tensor_transfer(chunk, out.device)
+        out[start:end].copy_(chunk)
+        del chunk
+        start = end
+    return out
@@ -0,0 +1,282 @@
+from functools import lru_cache
+import torch
+import numpy as np
+import torch.nn.functional as F
+from comfy import model_management
+
+from .utils import simple_resize, repeat_to_batch
+from .chunking import run_chunked, batch_slice
+from .masks import prepare_mask
+from . import profiling
+
+# 이 크기보다 큰 가우시안 커널은 "auto"에서 FFT로 계산 (separable 방식은 커널 크기에 비례해서 느려짐)
+FFT_KERNEL_SIZE = 31
+
+# 마스크 영역 crop 면적이 전체 면적의 이 비율 이하일 때만 영역별로 계산
+SPARSE_AREA_RATIO = 0.5
+
+BLUR_METHODS = ["auto", "separable", "fft"]
+
+def get_kernel_size(blur: float):
+    # 기존 torchvision GaussianBlur 설정과 같은 커널 크기
+    return int(6 * int(blur) + 1)
+
+@lru_cache(maxsize=32)
+def get_gaussian_kernel1d(kernel_size: int, sigma: float, device: torch.device, dtype: torch.dtype):
+    """
+    1D 가우시안 커널을 반환합니다. (커널 크기, sigma, 디바이스, dtype 별로 캐시)
+    torchvision의 _get_gaussian_kernel1d와 같은 값입니다.
+    """
+    half = (kernel_size - 1) * 0.5
+    x = torch.linspace(-half, half, steps=kernel_size, dtype=torch.float32)
+    pdf = torch.exp(-0.5 * (x / sigma).pow(2))
+    return (pdf / pdf.sum()).to(device=device, dtype=dtype)
+
+def _shift_add1d(x: torch.Tensor, weights: list, dim: int):
+    # padding 된 x를 커널 크기만큼 밀어가며 가중합 (CPU에서는 1D conv보다 빠름)
+    length = x.shape[dim] - len(weights) + 1
+    out = x.narrow(dim, 0, length) * weights[0]
+    for i, weight in enumerate(weights[1:], start=1):
+        out.add_(x.narrow(dim, i, length), alpha=weight)
+    return out
+
+def _blur_separable(x: torch.Tensor, kernel: torch.Tensor):
+    # 가로, 세로 1D 커널 두 번 (각 방향 reflect padding)
+    pad = kernel.numel() // 2
+    if x.device.type == "cpu":
+        weights = kernel.tolist()
+        x = _shift_add1d(F.pad(x, (pad, pad, 0, 0), mode="reflect"), weights, dim=-1)
+        return _shift_add1d(F.pad(x, (0, 0, pad, pad), mode="reflect"), weights, dim=-2)
+    x = F.conv2d(F.pad(x, (pad, pad, 0, 0), mode="reflect"), kernel.reshape(1, 1, 1, -1))
+    x = F.conv2d(F.pad(x, (0, 0, pad, pad), mode="reflect"), kernel.reshape(1, 1, -1, 1))
+    return x
+
+def _fft_conv1d(x: torch.Tensor, kernel: torch.Tensor, dim: int):
+    # padding 된 x에 대칭 커널을 FFT로 convolution 하고 valid 영역만 반환
+    length = x.shape[dim]
+    size = length + kernel.numel() - 1
+    spectrum = torch.fft.rfft(x, n=size, dim=dim)
+    kernel_spectrum = torch.fft.rfft(kernel, n=size)
+    shape = [1] * x.ndim
+    shape[dim] = -1
+    out = torch.fft.irfft(spectrum * kernel_spectrum.reshape(shape), n=size, dim=dim)
+    return out.narrow(dim, kernel.numel() - 1, length - kernel.numel() + 1)
+
+def _blur_fft(x: torch.Tensor, kernel: torch.Tensor):
+    # 커널 크기와 관계없이 O(N log N), 반정밀도는 FFT를 지원하지 않는 경우가 있어 float32로 계산
+    pad = kernel.numel() // 2
+    dtype = x.dtype
+    x = x.float()
+    kernel = kernel.float()
+    x = _fft_conv1d(F.pad(x, (pad, pad, 0, 0), mode="reflect"), kernel, dim=-1)
+    x = _fft_conv1d(F.pad(x, (0, 0, pad, pad), mode="reflect"), kernel, dim=-2)
+    return x.to(dtype)
+
+def gaussian_blur(images: torch.Tensor, blur: float, method: str = "auto", kernel_size: int = None):
+    """
+    (B, C, H, W) 텐서에 가우시안 블러를 적용합니다.
+    torchvision.transforms.GaussianBlur(6 * int(blur) + 1, blur)와 같은 결과를 1D 커널 두 번으로 계산합니다.
+
+    Args:
+        images (torch.Tensor): 입력 텐서 (B, C, H, W)
+        blur (float): 가우시안 블러의 시그마 값
+        method (str): "separable"은 1D conv, "fft"는 FFT convolution, "auto"는 커널 크기에 따라 선택
+        kernel_size (int, optional): 홀수 커널 크기 (기본값: 6 * int(blur) + 1)
+
+    Returns:
+        torch.Tensor: 블러가 적용된 텐서
+    """
+    if kernel_size is None:
+        kernel_size = get_kernel_size(blur)
+    if kernel_size <= 1:
+        return images
+
+    b, c, h, w = images.shape
+    kernel = get_gaussian_kernel1d(kernel_size, float(blur), images.device, images.dtype)
+    # 채널을 배치로 펼쳐서 단일 채널 커널 하나로 처리
+    x = images.reshape(b * c, 1, h, w)
+    if method == "fft" or (method == "auto" and kernel_size > FFT_KERNEL_SIZE):
+        x = _blur_fft(x, kernel)
+    else:
+        x = _blur_separable(x, kernel)
+    return x.reshape(b, c, h, w)
+
+def get_transfer_memory(channels: int, height: int, width: int, dtype: torch.dtype, blur: float, method: str = "auto"):
+    """
+    디테일 전송에서 배치 항목 하나를 처리하는 데 필요한 메모리 추정치 (byte)를 반환합니다. (dense 경로 기준)
+    """
+    kernel_size = get_kernel_size(blur)
+    # 타겟, 소스, 마스크 복사본과 블러, 디테일, 결과 중간 텐서
+    memory = 8 * channels * height * width * model_management.dtype_size(dtype)
+    if method == "fft" or (method == "auto" and kernel_size > FFT_KERNEL_SIZE):
+        # reflect pad 한 float32 입력, 복소수 스펙트럼, 출력
+        pad = kernel_size // 2
+        memory += 4 * channels * (height + 2 * pad) * (width + 2 * pad) * 4
+    return memory
+
+def get_mask_regions(mask: torch.Tensor, radius: int):
+    """
+    마스크의 항목별 영역 bounding box를 반환합니다.
+    마스크를 radius 만큼 팽창시킨 뒤 연결 요소를 구하므로, 가까운 영역은 하나로 합쳐지고
+    bounding box는 마스크 영역보다 radius 만큼 큽니다. (이미지 경계에서는 잘림)
+
+    Args:
+        mask (torch.Tensor): 마스크 텐서 (B, 1, H, W)
+        radius (int): 팽창 반경 (픽셀)
+
+    Returns:
+        List[List[tuple]]: 항목별 (y0, y1, x0, x1) 리스트
+    """
+    import cv2
+    masks = (mask[:, 0] > 0).to(device="cpu", dtype=torch.uint8).numpy()
+    kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8) if radius > 0 else None
+    regions = []
+    for cur in masks:
+        if kernel is not None:
+            cur = cv2.dilate(cur, kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(cur, connectivity=8)
+        # 0번은 배경
+        regions.append([(int(y), int(y + h), int(x), int(x + w)) for x, y, w, h, _ in stats[1:]])
+    return regions
+
+def _transfer(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float, mask: torch.Tensor, method: str):
+    # 같은 크기로 준비된 텐서들에 디테일 전송 수행 (source, mask는 배치 크기 1이면 broadcast)
+    B = target.shape[0]
+
+    # 소스 디테일은 소스 배치 크기로 계산 (배치 크기 1이면 반복하지 않고 broadcast)
+    detail = source - gaussian_blur(source, blur, method)
+    if detail.shape[0] not in (1, B):
+        detail = repeat_to_batch(detail, B)
+
+    tensor_out = gaussian_blur(target, blur, method) + detail
+    tensor_out = torch.lerp(target, tensor_out, blend_ratio)
+    if mask is not None:
+        tensor_out = torch.lerp(target, tensor_out, mask)
+    return tensor_out
+
+def _transfer_sparse(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float, mask: torch.Tensor,
+                     method: str, regions: list, pad: int):
+    # 마스크 영역 주변 crop에서만 디테일 전송을 수행하고 결과를 붙여 넣음
+    # crop은 영역보다 블러 커널 반경(pad)만큼 크게 잘라서 영역 안의 블러 값이 전체 이미지에서 계산한 값과 같도록 함
+    # (마스크가 0인 픽셀은 dense 경로에서도 타겟 값 그대로이므로 영역 밖은 계산하지 않음)
+    H, W = target.shape[-2:]
+    tensor_out = target.clone()
+    for i, boxes in enumerate(regions):
+        for y0, y1, x0, x1 in boxes:
+            cy0, cy1, cx0, cx1 = max(y0 - pad, 0), min(y1 + pad, H), max(x0 - pad, 0), min(x1 + pad, W)
+            crop = (..., slice(cy0, cy1), slice(cx0, cx1))
+            k, l = i % source.shape[0], i % mask.shape[0]
+            crop_out = _transfer(target[i:i + 1][crop], source[k:k + 1][crop], blur, blend_ratio, mask[l:l + 1][crop], method)
+            tensor_out[i, :, y0:y1, x0:x1] = crop_out[0, :, y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0]
+    return tensor_out
+
+def _transfer_masked(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float, mask: torch.Tensor,
+                     method: str):
+    # 마스크 영역의 crop 면적이 충분히 작을 때만 영역별로 계산 (마스크가 없거나 영역이 크면 전체 계산)
+    if mask is None:
+        return _transfer(target, source, blur, blend_ratio, None, method)
+    B, C, H, W = target.shape
+    pad = get_kernel_size(blur) // 2
+    regions = get_mask_regions(repeat_to_batch(mask, B), pad)
+    area = sum((min(y1 + pad, H) - max(y0 - pad, 0)) * (min(x1 + pad, W) - max(x0 - pad, 0))
+               for boxes in regions for y0, y1, x0, x1 in boxes)
+    if area <= SPARSE_AREA_RATIO * B * H * W:
+        return _transfer_sparse(target, source, blur, blend_ratio, mask, method, regions, pad)
+    return _transfer(target, source, blur, blend_ratio, mask, method)
+
+def _detail_transfer(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float,
+                     mask: torch.Tensor, method: str):
+    # 배치 chunk 하나를 실행 디바이스에서 계산 (결과는 실행 디바이스에 있음)
+    B, C, H, W = target.shape
+    device = model_management.get_torch_device()
+    for cur in (target, source, mask):
+        profiling.record_tensor_transfer(cur, device)
+    target_tensor = target.to(device)
+    source_tensor = source.to(device=device, dtype=target_tensor.dtype)
+
+    # 소스 리사이즈 (필요한 경우)
+    if source_tensor.shape[-2:] != (H, W):
+        source_tensor = simple_resize(source_tensor, H, W)
+
+    return _transfer_masked(target_tensor, source_tensor, blur, blend_ratio, mask, method)
+
+def detail_transfer(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float,
+                    mask: torch.Tensor = None, method: str = "auto"):
+    """
+    (B, C, H, W) 타겟 텐서에 소스 텐서의 디테일(소스 - 블러된 소스)을 전송합니다.
+    마스크 영역이 작으면 마스크 영역 주변만 계산합니다. (결과는 전체를 계산한 것과 같음)
+    배치는 사용 가능한 메모리에 맞는 chunk로 나누어 계산합니다. (chunking.run_chunked)
+    입력 텐서는 변경하지 않으며, 결과는 타겟과 같은 디바이스, dtype으로 반환합니다.
+
+    Args:
+        target (torch.Tensor): 타겟 텐서 (B, C, H, W)
+        source (torch.Tensor): 소스 텐서 (B 또는 1, C, H, W)
+        blur (float): 가우시안 블러의 시그마 값
+        blend_ratio (float): 블렌딩 비율
+        mask (torch.Tensor, optional): 마스크 텐서 (B, H, W) 또는 (B, 1, H, W)
+        method (str): 가우시안 블러 계산 방법 (gaussian_blur 참고)
+
+    Returns:
+        torch.Tensor: 디테일이 전송된 결과 텐서 (B, C, H, W), 클램핑 하지 않음
+    """
+    B, C, H, W = target.shape
+    if mask is not None:
+        # 실행 디바이스에 타겟 크기로 준비된 마스크 (채널 방향은 broadcast, 같은 마스크는 캐시된 것을 공유)
+        mask = prepare_mask(mask, H, W, model_management.get_torch_device(), target.dtype)
+
+    transfer_fn = lambda start, end: _detail_transfer(target[start:end], batch_slice(source, start, end, B), blur, blend_ratio,
+                                                      batch_slice(mask, start, end, B), method)
+    memory_per_item = get_transfer_memory(C, H, W, target.dtype, blur, method)
+    return run_chunked(transfer_fn, B, memory_per_item, model_management.get_torch_device(),
+                       out=torch.empty_like(target), name="detail transfer")
+
+def latent_detail_transfer(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float,
+                           mask: torch.Tensor = None, method: str = "auto"):
+    """
+    잠재 표현 (B, C, H, W)에 소스 잠재 표현의 디테일을 전송합니다.
+    마스크 영역이 작으면 마스크 영역 주변만 계산합니다. (결과는 전체를 계산한 것과 같음)
+    타겟의 디바이스, dtype 그대로 계산하며, 잠재 표현은 값 범위가 정해져 있지 않으므로 클램핑 하지 않습니다.
+
+    Args:
+        target (torch.Tensor): 타겟 잠재 표현 (B, C, H, W)
+        source (torch.Tensor): 소스 잠재 표현 (B 또는 1, C, H, W)
+        blur (float): 가우시안 블러의 시그마 값 (잠재 공간 픽셀 기준)
+        blend_ratio (float): 블렌딩 비율
+        mask (torch.Tensor, optional): 마스크 텐서 (B, H, W), 잠재 표현과 크기가 다르면 영역 평균 또는 보간
+        method (str): 가우시안 블러 계산 방법 (gaussian_blur 참고)
+
+    Returns:
+        torch.Tensor: 디테일이 전송된 잠재 표현 (B, C, H, W)
+    """
+    H, W = target.shape[-2:]
+    source = source.to(device=target.device, dtype=target.dtype)
+    if source.shape[-2:] != (H, W):
+        source = F.interpolate(source, size=(H, W), mode="bilinear", align_corners=False)
+
+    if mask is not None:
+        # 이미지 해상도 마스크는 영역 평균으로 줄인 pyramid level 사용 (masks.prepare_mask)
+        mask = prepare_mask(mask, H, W, target.device, target.dtype)
+
+    # 마스크 영역이 작으면 영역 주변만 계산 (이미지 도메인 detail_transfer와 같은 기준)
+    return _transfer_masked(target, source, blur, blend_ratio, mask, method)
+
+def add_detail_transfer(target: torch.Tensor, source: torch.Tensor, blur: float, blend_ratio: float,
+                        mask: torch.Tensor = None, method: str = "auto"):
+    """
+    타겟 이미지에 소스 이미지의 디테일을 전송합니다.
+
+    Args:
+        target (torch.Tensor): 타겟 이미지 텐서 (B, H, W, C)
+        source (torch.Tensor): 소스 이미지 텐서 (B, H, W, C)
+        blur (float): 가우시안 블러의 시그마 값
+        blend_ratio (float): 블렌딩 비율
+        mask (torch.Tensor, optional): 마스크 텐서
+        method (str): 가우시안 블러 계산 방법 ("auto", "separable", "fft")
+
+    Returns:
+        torch.Tensor: 디테일이 전송된 결과 이미지 텐서 (타겟 이미지와 같은 디바이스)
+    """
+    tensor_out = detail_transfer(target.permute(0, 3, 1, 2), source.permute(0, 3, 1, 2), blur, blend_ratio, mask, method)
+
+    # 결과 클램핑 및 형식 변환
+    return tensor_out.clamp_(0, 1).permute(0, 2, 3, 1)
@@ -0,0 +1,254 @@
+"""
+마스크 준비 (크기 변환, 팽창/침식/페더링)
+
+같은 마스크를 latent injection, 디테일 전송(이미지/잠재 공간)에서 각자 리사이즈하지 않도록
+마스크 digest 별로 실행 디바이스에 마스크 pyramid를 만들어 두고 공유합니다.
+- level 0은 팽창(dilate), 침식(erode), 페더링(feather)을 적용한 원래 해상도 마스크
+- level k는 level k-1을 2x2 영역 평균으로 줄인 마스크 (필요한 level까지만 만듦, 8배 축소한 latent 해상도는 level 3)
+- 요청한 크기가 level 크기와 다르면 level 0에서 영역 평균(축소) 또는 bilinear(확대)로 변환하고 결과를 캐시
+
+반환하는 텐서는 캐시와 공유하므로 in-place로 수정하지 마세요.
+"""
+import math
+import weakref
+import threading
+from collections import OrderedDict
+import torch
+import torch.nn.functional as F
+from comfy import model_management
+
+from .cache import tensor_digest, make_key, tensor_nbytes, env_megabytes
+from . import profiling
+
+# 마스크 pyramid 캐시 용량 (실행 디바이스 메모리 기준)
+PYRAMID_CACHE_MEMORY = env_megabytes("PRODUCTFIX_MASK_PYRAMID_MEMORY_MB", 256)
+
+_lock = threading.Lock()
+_pyramids = OrderedDict()
+_digests = {}
+_stats = {"hits": 0, "misses": 0, "resizes": 0}
+
+def as_mask4d(mask: torch.Tensor):
+    """
+    (H, W), (B, H, W) 마스크를 (B, 1, H, W)로 변환합니다.
+    """
+    if mask.ndim == 2:
+        mask = mask.unsqueeze(0)
+    if mask.ndim == 3:
+        mask = mask.unsqueeze(1)
+    return mask
+
+def mask_digest(mask: torch.Tensor):
+    """
+    마스크의 content digest를 반환합니다.
+    같은 텐서 객체가 수정되지 않았으면 (_version) 이전에 계산한 digest를 사용합니다.
+    (ComfyUI는 노드 출력 텐서를 그대로 다음 노드들에 전달하므로 같은 마스크는 한 번만 해싱)
+    inference tensor(torch.inference_mode에서 만든 텐서)는 version counter가 없으므로 매번 해싱합니다.
+    """
+    if mask.is_inference():
+        return tensor_digest(mask)
+
+    with _lock:
+        entry = _digests.get(id(mask), None)
+        if entry is not None and entry[0]() is mask and entry[1] == mask._version:
+            return entry[2]
+
+    digest = tensor_digest(mask)
+    key = id(mask)
+    with _lock:
+        _digests[key] = (weakref.ref(mask, lambda _: _digests.pop(key, None)), mask._version, digest)
+    return digest
+
+def _max_filter(mask: torch.Tensor, radius: int):
+    # 정사각형 구조 요소의 max 필터를 가로, 세로 1D max pooling 두 번으로 계산
+    size = 2 * radius + 1
+    mask = F.max_pool2d(mask, (1, size), stride=1, padding=(0, radius))
+    return F.max_pool2d(mask, (size, 1), stride=1, padding=(radius, 0))
+
+def dilate_mask(mask: torch.Tensor, radius: int):
+    """
+    (B, 1, H, W) 마스크를 radius 픽셀만큼 팽창합니다.
+    """
+    if radius <= 0:
+        return mask
+    return _max_filter(mask, radius)
+
+def erode_mask(mask: torch.Tensor, radius: int):
+    """
+    (B, 1, H, W) 마스크를 radius 픽셀만큼 침식합니다. (이미지 밖은 마스크 영역으로 취급)
+    """
+    if radius <= 0:
+        return mask
+    return -_max_filter(-mask, radius)
+
+def get_feather_kernel_size(feather: float, height: int, width: int):
+    """
+    페더링 가우시안 커널 크기를 반환합니다. (±3 시그마를 덮는 홀수 크기)
+    디테일 전송 커널(6 * int(blur) + 1)과 달리 시그마를 정수로 자르지 않으므로 1 미만의 페더링도 적용됩니다.
+    reflect padding을 위해 마스크 크기보다 작게 제한합니다.
+    """
+    kernel_size = 2 * math.ceil(3 * feather) + 1
+    return min(kernel_size, 2 * min(height, width) - 1)
+
+def feather_mask(mask: torch.Tensor, feather: float):
+    """
+    (B, 1, H, W) 마스크 경계를 가우시안 블러(시그마 feather 픽셀)로 부드럽게 만듭니다.
+    """
+    # detail_transfer가 이 모듈을 import 하므로 사용할 때 import
+    from .detail_transfer import gaussian_blur
+    if feather <= 0:
+        return mask
+    kernel_size = get_feather_kernel_size(feather, *mask.shape[-2:])
+    return gaussian_blur(mask, feather, kernel_size=kernel_size)
+
+def refine_mask(mask: torch.Tensor, dilate: int = 0, erode: int = 0, feather: float = 0.0):
+    """
+    (B, 1, H, W) 마스크에 팽창, 침식, 페더링을 순서대로 적용합니다.
+    """
+    mask = dilate_mask(mask, dilate)
+    mask = erode_mask(mask, erode)
+    return feather_mask(mask, feather)
+
+class MaskPyramid:
+    """
+    실행 디바이스에 준비된 마스크와 축소 level, 크기별 변환 결과
+    """
+    def __init__(self, mask: torch.Tensor):
+        self.levels = [mask]
+        self.sizes = {tuple(mask.shape[-2:]): mask}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            tensors = {id(cur): cur for cur in self.levels + list(self.sizes.values())}
+        return sum(tensor_nbytes(cur) for cur in tensors.values())
+
+    def _build_until(self, height: int, width: int):
+        # 다음 level도 요청한 크기 이상이면 level 추가 (홀수 크기에서는 중단, 각 level은 원래 마스크의 영역 평균 변환과 같음)
+        while True:
+            last = self.levels[-1]
+            h, w = last.shape[-2:]
+            if h % 2 != 0 or w % 2 != 0 or h // 2 < height or w // 2 < width:
+                return
+            level = F.avg_pool2d(last, 2)
+            self.levels.append(level)
+            self.sizes.setdefault(tuple(level.shape[-2:]), level)
+
+    def get(self, height: int, width: int):
+        """
+        (B, 1, height, width) 크기의 마스크를 반환합니다.
+        """
+        with self._lock:
+            mask = self.sizes.get((height, width), None)
+            if mask is not None:
+                return mask
+
+            # 2배씩 줄인 크기면 level 사용, 아니면 원래 해상도에서 변환 (중간 level에서 변환하면 영역 평균이 부정확해짐)
+            self._build_until(height, width)
+            mask = self.sizes.get((height, width), None)
+            if mask is not None:
+                return mask
+            source = self.levels[0]
+            downscale = source.shape[-2] > height or source.shape[-1] > width
+            mask = F.interpolate(source, size=(height, width), mode="area" if downscale else "bilinear")
+            self.sizes[(height, width)] = mask
+
+        with _lock:
+            _stats["resizes"] += 1
+        return mask
+
+def _cache_bytes():
+    # 같은 pyramid가 여러 키에 등록될 수 있으므로 (get_refined_mask) 한 번씩만 셈
+    pyramids = {id(cur): cur for cur in _pyramids.values()}
+    return sum(cur.nbytes for cur in pyramids.values())
+
+def _evict():
+    # 용량을 넘으면 가장 오래 사용되지 않은 항목부터 제거 (방금 사용한 항목은 유지)
+    while len(_pyramids) > 1 and _cache_bytes() > PYRAMID_CACHE_MEMORY:
+        _pyramids.popitem(last=False)
+
+def _pyramid_key(digest: str, device: torch.device, dtype: torch.dtype, dilate: int, erode: int, feather: float):
+    return make_key(digest, str(device), str(dtype), int(dilate), int(erode), float(feather))
+
+def get_mask_pyramid(mask: torch.Tensor, device: torch.device = None, dtype: torch.dtype = torch.float32,
+                     dilate: int = 0, erode: int = 0, feather: float = 0.0):
+    """
+    마스크의 pyramid를 반환합니다. (마스크 digest, 디바이스, dtype, 팽창/침식/페더링 설정 별로 캐시)
+
+    Args:
+        mask (torch.Tensor): 마스크 텐서 (H, W), (B, H, W) 또는 (B, 1, H, W)
+        device (torch.device, optional): 마스크를 준비할 디바이스 (기본값: 실행 디바이스)
+        dtype (torch.dtype): 마스크 dtype
+        dilate (int): 팽창 반경 (픽셀)
+        erode (int): 침식 반경 (픽셀)
+        feather (float): 페더링 가우시안 블러 시그마 (픽셀)
+
+    Returns:
+        MaskPyramid: 마스크 pyramid
+    """
+    if device is None:
+        device = model_management.get_torch_device()
+    device = torch.device(device)
+    key = _pyramid_key(mask_digest(mask), device, dtype, dilate, erode, feather)
+
+    with _lock:
+        pyramid = _pyramids.get(key, None)
+        if pyramid is not None:
+            _pyramids.move_to_end(key)
+            _stats["hits"] += 1
+            return pyramid
+        _stats["misses"] += 1
+
+    # 팽창/침식/페더링은 float32로 계산한 뒤 요청한 dtype으로 변환
+    profiling.record_tensor_transfer(mask, device)
+    prepared = as_mask4d(mask).to(device=device, dtype=torch.float32)
+    prepared = refine_mask(prepared, int(dilate), int(erode), float(feather)).to(dtype=dtype)
+
+    with _lock:
+        pyramid = _pyramids.setdefault(key, MaskPyramid(prepared))
+        _pyramids.move_to_end(key)
+        _evict()
+    return pyramid
+
+def prepare_mask(mask: torch.Tensor, height: int, width: int, device: torch.device = None, dtype: torch.dtype = torch.float32,
+                 dilate: int = 0, erode: int = 0, feather: float = 0.0):
+    """
+    마스크를 (B, 1, height, width) 크기로 준비하여 반환합니다. (get_mask_pyramid 참고)
+    반환하는 텐서는 캐시와 공유하므로 in-place로 수정하지 마세요.
+    """
+    return get_mask_pyramid(mask, device, dtype, dilate, erode, feather).get(height, width)
+
+def get_refined_mask(mask: torch.Tensor, dilate: int = 0, erode: int = 0, feather: float = 0.0, device: torch.device = None):
+    """
+    팽창, 침식, 페더링을 적용한 (B, H, W) 마스크를 intermediate device로 반환합니다.
+    결과 마스크의 pyramid(float32)를 캐시에 함께 등록하므로 결과를 받는 노드에서 다시 준비하지 않습니다.
+    """
+    if device is None:
+        device = model_management.get_torch_device()
+    pyramid = get_mask_pyramid(mask, device, torch.float32, dilate, erode, feather)
+    # 캐시된 level을 공유하지 않도록 복사
+    refined = pyramid.levels[0][:, 0].to(model_management.intermediate_device(), copy=True)
+
+    key = _pyramid_key(mask_digest(refined), torch.device(device), torch.float32, 0, 0, 0.0)
+    with _lock:
+        _pyramids.setdefault(key, pyramid)
+        _evict()
+    return refined
+
+def get_mask_stats():
+    """
+    마스크 pyramid 캐시 hit/miss, 크기 변환 횟수, 사용 중인 용량을 반환합니다.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_pyramids)
+        stats["bytes"] = _cache_bytes()
+    return stats
+
+def clear_mask_cache():
+    """
+    마스크 pyramid 캐시를 비웁니다.
+    """
+    with _lock:
+        _pyramids.clear()
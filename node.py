@@ -1,15 +1,56 @@
 import os, sys
-import logging
+import torch
 import folder_paths
 
 from comfy import model_management
 from comfy.model_patcher import ModelPatcher
-from comfy.samplers import KSamplerX0Inpaint
 
-from .advanced_sampler import inject_ksamplerx0inpaint_call
-from .ocr import (get_text_mask, get_languages, language_map)
-from .vq import (load_vq_model, vqmodel_encode, vqmodel_decode)
-from .utils import (simple_resize, add_detail_transfer, dynamic_resize)
+from .advanced_sampler import set_latent_injection
+from .ocr import (get_text_mask, get_languages, language_map, start_reader_warmup)
+from .vq import (load_vq_model, vqmodel_encode, vqmodel_decode, PRECISIONS)
+from .utils import (parse_float_list, repeat_to_batch)
+from .masks import prepare_mask, get_refined_mask
+from .resize import dynamic_resize_list, RESIZE_METHODS, SNAP_MODES
+from .detail_transfer import add_detail_transfer, latent_detail_transfer, BLUR_METHODS
+
+# 설정된 경우 EasyOCR 리더를 백그라운드에서 미리 로드
+start_reader_warmup()
+
+# VQLoader의 vae_approx 목록 캐시 (INPUT_TYPES는 프롬프트 검증마다 호출됨)
+_vq_filenames = {"mtimes": None, "paths": {}}
+
+def _get_mtimes(dirs):
+    mtimes = {}
+    for cur in dirs:
+        try:
+            mtimes[cur] = os.stat(cur).st_mtime_ns
+        except OSError:
+            mtimes[cur] = None
+    return mtimes
+
+def get_vq_filenames():
+    """
+    vae_approx 폴더에서 이름에 "vq"가 포함된 파일의 {파일 이름: 전체 경로}를 반환합니다.
+    폴더 목록과 파일이 있는 디렉토리들의 수정 시각이 바뀌지 않으면 이전 목록을 그대로 사용합니다.
+    """
+    cached = _vq_filenames
+    if cached["mtimes"] is not None and _get_mtimes(cached["mtimes"]) == cached["mtimes"] \
+            and set(folder_paths.get_folder_paths("vae_approx")).issubset(cached["mtimes"]):
+        return cached["paths"]
+
+    paths, dirs = {}, list(folder_paths.get_folder_paths("vae_approx"))
+    for cur in folder_paths.get_filename_list("vae_approx"):
+        full_path = folder_paths.get_full_path("vae_approx", cur)
+        if full_path is None:
+            continue
+        dirs.append(os.path.dirname(full_path))
+        name = os.path.basename(cur)
+        if "vq" in cur and name not in paths:
+            paths[name] = full_path
+
+    _vq_filenames["mtimes"] = _get_mtimes(dict.fromkeys(dirs))
+    _vq_filenames["paths"] = paths
+    return paths
 
 # ModelPatcher의 calculate_weight 메서드를 초기화하는 클래스
 class ResetModelPatcherCalculateWeight:
@@ -39,41 +80,50 @@ class ApplyLatentInjection:
                              "start_sigma": ("FLOAT", {"default": 15.0}),
                              "end_sigma": ("FLOAT", {"default": 0.0})
                              },
-                "optional": {"remain_injected":([True, False], {"default":True})
+                "optional": {"remain_injected":([True, False], {"default":True}),
+                             "start_sigmas": ("STRING", {"default": "", "multiline": False}),
+                             "end_sigmas": ("STRING", {"default": "", "multiline": False}),
+                             "mask_strengths": ("STRING", {"default": "", "multiline": False}),
                            },
                 }
     RETURN_TYPES = ("MODEL", "LATENT",)
     FUNCTION = "apply_latent_injection"
     CATEGORY = "productfix"
 
-    def apply_latent_injection(self, model, latents, inject_image_embed, inject_mask, start_sigma, end_sigma, remain_injected=True):
+    def apply_latent_injection(self, model, latents, inject_image_embed, inject_mask, start_sigma, end_sigma, remain_injected=True,
+                               start_sigmas="", end_sigmas="", mask_strengths=""):
         device = model_management.get_torch_device()
         dtype = model_management.VAE_DTYPES[0]
 
-        # KSamplerX0Inpaint의 __call__ 메서드를 수정된 버전으로 교체
-        original_ksampler_call_fn = KSamplerX0Inpaint.__call__
-        KSamplerX0Inpaint.__call__ = inject_ksamplerx0inpaint_call(original_ksampler_call_fn)
-        logging.info("\033[94m[middlek latent injection] KSamplerX0Inpaint.__call__ is injected to inject_ksamplerx0inpaint_call\033[0m")
-
         # 잠재 공간 및 마스크 준비
         # (데이터 형식 변환 및 디바이스 이동)
         if isinstance(inject_image_embed, dict):
             inject_image_embed = inject_image_embed["samples"]
         
-        inject_image_embed = inject_image_embed.to(dtype=dtype)
         b, c, h, w = inject_image_embed.shape
-        if len(inject_mask.shape) != 4:
-            inject_mask = inject_mask.unsqueeze(0)
-        
         inject_image_embed = inject_image_embed.to(device=device, dtype=dtype)
-        inject_mask = simple_resize(inject_mask, h, w).to(device=device, dtype=dtype)
+        # latent 크기 마스크 (같은 마스크는 디테일 전송 등과 공유하는 pyramid에서 가져옴)
+        inject_mask = prepare_mask(inject_mask, h, w, device, dtype)
+
+        # 배치 항목별 마스크 강도 적용 (mask = 1 - strength * (1 - mask))
+        strengths = parse_float_list(mask_strengths)
+        if strengths is not None:
+            strengths = repeat_to_batch(torch.tensor(strengths, device=device, dtype=dtype), b).reshape(-1, 1, 1, 1)
+            inject_mask = 1. - strengths * (1. - repeat_to_batch(inject_mask, b))
+
+        # 배치 항목별 injection 구간 (입력이 없으면 start_sigma, end_sigma를 모든 항목에 사용)
+        start_sigma = parse_float_list(start_sigmas) or start_sigma
+        end_sigma = parse_float_list(end_sigmas) or end_sigma
         
+        latents = latents.copy()
         latents["samples"] = inject_image_embed
         latents["noise_mask"] = inject_mask
 
-        # 모델 옵션에 latent injection 파라미터 추가
+        # clone 된 모델의 옵션에 latent injection 파라미터 추가
+        # (이 모델을 사용하는 sampling에만 적용되고 다른 prompt의 sampling은 원래 경로로 실행)
         if hasattr(model, "model_options"):
-            model.model_options["is_latent_inject"] = {"start_sigma":start_sigma, "end_sigma":end_sigma, "remain_injected":remain_injected}
+            model = model.clone()
+            set_latent_injection(model, start_sigma, end_sigma, remain_injected)
 
         return (model, latents, )
 
@@ -83,7 +133,7 @@ class VQLoader:
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "vq_name": ([os.path.basename(cur) for cur in folder_paths.get_filename_list("vae_approx") if "vq" in cur], ),
+                "vq_name": (list(get_vq_filenames()), ),
             }
         }
 
@@ -93,7 +143,9 @@ class VQLoader:
     CATEGORY = "productfix"
 
     def load_vq(self, vq_name):
-        ckpt = os.path.join(folder_paths.get_folder_paths("vae_approx")[0], vq_name)
+        ckpt = get_vq_filenames().get(vq_name, None)
+        if ckpt is None:
+            ckpt = os.path.join(folder_paths.get_folder_paths("vae_approx")[0], vq_name)
         vqmodel = load_vq_model(ckpt)
         return (vqmodel,)
 
@@ -105,6 +157,15 @@ class VQEncoder:
             "required": {
                 "vq": ("VQ",),
                 "images": ("IMAGE", ),
+            },
+            "optional": {
+                "tiled": (["auto", "enable", "disable"], {"default": "auto"}),
+                "tile_size": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "overlap": ("INT", {"default": 64, "min": 0, "max": 1024, "step": 8}),
+                "use_cache": ("BOOLEAN", {"default": False}),
+                "precision": (list(PRECISIONS.keys()), {"default": "default"}),
+                "channels_last": ("BOOLEAN", {"default": False}),
+                "compile": ("BOOLEAN", {"default": False}),
             }
         }
 
@@ -112,8 +173,11 @@ class VQEncoder:
     FUNCTION = "encode"
     CATEGORY = "productfix"
 
-    def encode(self, images, vq):
-        latents = vqmodel_encode(images, vq)
+    def encode(self, images, vq, tiled="auto", tile_size=0, overlap=64, use_cache=False, precision="default", channels_last=False,
+               compile=False):
+        # tile_size가 0이면 사용 가능한 메모리로 tile 크기 결정
+        latents = vqmodel_encode(images, vq, tiled=tiled, tile_size=tile_size, overlap=overlap, use_cache=use_cache,
+                                 precision=precision, channels_last=channels_last, compiled=compile)
         latents = {"samples":latents}
         return (latents,)
 
@@ -125,6 +189,14 @@ class VQDecoder:
             "required": {
                 "vq": ("VQ",),
                 "latents": ("LATENT", ),
+            },
+            "optional": {
+                "tiled": (["auto", "enable", "disable"], {"default": "auto"}),
+                "tile_size": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "overlap": ("INT", {"default": 64, "min": 0, "max": 1024, "step": 8}),
+                "precision": (list(PRECISIONS.keys()), {"default": "default"}),
+                "channels_last": ("BOOLEAN", {"default": False}),
+                "compile": ("BOOLEAN", {"default": False}),
             }
         }
 
@@ -132,10 +204,12 @@ class VQDecoder:
     FUNCTION = "decode"
     CATEGORY = "productfix"
 
-    def decode(self, latents, vq):
+    def decode(self, latents, vq, tiled="auto", tile_size=0, overlap=64, precision="default", channels_last=False,
+               compile=False):
         if isinstance(latents, dict):
             latents = latents.get("samples", None)
-        images = vqmodel_decode(latents, vq)
+        images = vqmodel_decode(latents, vq, tiled=tiled, tile_size=tile_size, overlap=overlap,
+                                precision=precision, channels_last=channels_last, compiled=compile)
         return (images,)
 
 # 이미지에서 텍스트 마스크를 생성하는 클래스
@@ -152,19 +226,34 @@ class GetTextMask:
                         "STRING",
                         {"default": "en,ko", "multiline": False},
                     ),
-                             }}
+                             },
+                "optional": {"mode":(["detect", "readtext"], {"default":"detect"}),
+                             "use_cache":("BOOLEAN", {"default":True}),
+                             "max_pixels":("INT", {"default": 0, "min": 0, "max": sys.maxsize, "step": 1}),
+                             "tiling":(["tile", "downscale"], {"default":"tile"}),
+                             "execution":(["in-process", "process pool"], {"default":"in-process"}),
+                             "workers":("INT", {"default": 0, "min": 0, "max": 256, "step": 1}),
+                             "threads_per_worker":("INT", {"default": 0, "min": 0, "max": 256, "step": 1}),
+                             },
+                }
     RETURN_TYPES = ("MASK",)
     FUNCTION = "get_text_mask"
     CATEGORY = "productfix"
 
-    def get_text_mask(self, image, languages:str, codes:str):
+    def get_text_mask(self, image, languages:str, codes:str, mode:str="detect", use_cache:bool=True,
+                      max_pixels:int=0, tiling:str="tile", execution:str="in-process",
+                      workers:int=0, threads_per_worker:int=0):
         # 언어 설정에 따라 타겟 언어 결정
         if languages != "not use":
             target_languages = [language_map[languages.split("/")[0]]]
         else:
             target_languages = codes.split(",")
         
-        mask = get_text_mask(image, target_languages)
+        # detect: 검출 모델만 실행 (인식 모델은 마스크에 사용되지 않음)
+        # max_pixels: 큰 이미지는 tile 또는 축소 이미지로 나누어 검출 (0이면 전체 해상도 그대로)
+        mask = get_text_mask(image, target_languages, mode=mode, use_cache=use_cache,
+                             max_pixels=max_pixels, tiling=tiling, execution=execution,
+                             workers=workers, threads_per_worker=threads_per_worker)
         return (mask, )
 
 # 디테일 전송을 수행하는 클래스 (이미지 도메인)
@@ -179,6 +268,7 @@ class DetailTransferAdd:
                 },
             "optional": {
                 "mask": ("MASK", ),
+                "blur_method": (BLUR_METHODS, {"default": "auto"}),
             }
         }
     
@@ -186,8 +276,8 @@ class DetailTransferAdd:
     FUNCTION = "detail_transfer_add"
     CATEGORY = "productfix"
 
-    def detail_transfer_add(self, target, source, blur, blend_ratio, mask=None):
-        output_image = add_detail_transfer(target, source, blur, blend_ratio, mask)
+    def detail_transfer_add(self, target, source, blur, blend_ratio, mask=None, blur_method="auto"):
+        output_image = add_detail_transfer(target, source, blur, blend_ratio, mask, blur_method)
         return (output_image, )
 
 # 디테일 전송을 수행하는 클래스 (잠재 공간 도메인)
@@ -202,6 +292,7 @@ class DetailTransferLatentAdd:
                 },
             "optional": {
                 "mask": ("MASK", ),
+                "blur_method": (BLUR_METHODS, {"default": "auto"}),
             }
         }
     
@@ -209,24 +300,38 @@ class DetailTransferLatentAdd:
     FUNCTION = "detail_transfer_add"
     CATEGORY = "productfix"
 
-    def detail_transfer_add(self, target, source, blur, blend_ratio, mask=None):
-        # 잠재 공간을 이미지 형식으로 변환
-        if type(target) == dict:
-            target = target["samples"]
-        if type(source) == dict:
-            source = source["samples"]
-        
-        target = target.permute(0,2,3,1)
-        source = source.permute(0,2,3,1)
-        
-        # 디테일 전송 수행
-        output_image = add_detail_transfer(target, source, blur, blend_ratio, mask)
-        
-        # 결과를 다시 잠재 공간 형식으로 변환
-        output_latent = output_image.permute(0,3,1,2)
+    def detail_transfer_add(self, target, source, blur, blend_ratio, mask=None, blur_method="auto"):
+        # 잠재 공간 (B, C, H, W) 그대로 디테일 전송 수행
+        samples = latent_detail_transfer(target["samples"] if isinstance(target, dict) else target,
+                                         source["samples"] if isinstance(source, dict) else source,
+                                         blur, blend_ratio, mask, blur_method)
+
+        # noise_mask 등 타겟 latent의 다른 항목은 유지
+        output_latent = target.copy() if isinstance(target, dict) else {}
+        output_latent["samples"] = samples
 
         return (output_latent, )
     
+# 마스크 팽창/침식/페더링
+class MaskRefine:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {"required": {
+                    "mask": ("MASK", ),
+                    },
+                "optional": {
+                    "dilate": ("INT", {"default": 0, "min": 0, "max": 512, "step": 1}),
+                    "erode": ("INT", {"default": 0, "min": 0, "max": 512, "step": 1}),
+                    "feather": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 100.0, "step": 0.1}),
+                    }}
+    RETURN_TYPES = ("MASK",)
+    FUNCTION = "refine_mask"
+    CATEGORY = "productfix"
+
+    def refine_mask(self, mask, dilate=0, erode=0, feather=0.0):
+        # 실행 디바이스에서 팽창 -> 침식 -> 페더링 순서로 적용 (결과 마스크의 pyramid는 다음 노드에서 재사용)
+        return (get_refined_mask(mask, dilate, erode, feather), )
+
 # 동적 이미지 리사이즈
 class DynamicImageResize:
     @classmethod
@@ -235,11 +340,21 @@ class DynamicImageResize:
                     "image": ("IMAGE",),
                     "max_pixels": ("INT", {"default": 1024*1024, "min": 500, "max": sys.maxsize, "step": 1}),
                     "min_pixels": ("INT", {"default": 512*512, "min": 500, "max": sys.maxsize, "step": 1}),
+                    },
+                "optional": {
+                    "method": (RESIZE_METHODS, {"default": "lanczos"}),
+                    "snap": (SNAP_MODES, {"default": "none"}),
+                    "batch_by_bucket": ("BOOLEAN", {"default": False}),
                     }}
     RETURN_TYPES = ("IMAGE",)
     FUNCTION = "dynamic_image_resize"
     CATEGORY = "productfix"
 
-    def dynamic_image_resize(self, image, max_pixels:int, min_pixels:int):
-        resized_image = dynamic_resize(image, max_pixels=max_pixels, min_pixels=min_pixels)
-        return (resized_image, )
\ No newline at end of file
+    # 크기가 다른 이미지 리스트를 한 번에 받아서 같은 크기끼리 묶어 처리
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True,)
+
+    def dynamic_image_resize(self, image, max_pixels, min_pixels, method=["lanczos"], snap=["none"], batch_by_bucket=[False]):
+        resized_images = dynamic_resize_list(image, max_pixels=max_pixels[0], min_pixels=min_pixels[0],
+                                             method=method[0], snap=snap[0], batch_by_bucket=batch_by_bucket[0])
+        return (resized_images, )
\ No newline at end of file
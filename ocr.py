@@ -1,10 +1,57 @@
 import os
+import sys
+import time
+import atexit
+import contextlib
+import logging
+import importlib
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
 from typing import List
-import easyocr
-import cv2
 import torch
 import numpy as np
 import folder_paths
+from comfy import model_management
+
+from .cache import (TensorStore, get_cache_dir, tensor_digest, make_key, env_megabytes)
+from .chunking import run_chunked
+from .text_detect import load_reader, detect_text_polygons, detect_text_polygons_tiled, fill_polygons
+from . import profiling
+
+# EasyOCR reader 캐시 설정 (환경 변수로 조정 가능)
+# PRODUCTFIX_OCR_READER_CACHE_SIZE: 동시에 유지할 reader 수 (0이면 캐시하지 않음)
+# PRODUCTFIX_OCR_WARMUP: 시작 시 미리 로드할 언어 조합 (예: "en,ko;ja")
+READER_CACHE_SIZE = int(os.environ.get("PRODUCTFIX_OCR_READER_CACHE_SIZE", 2))
+READER_WARMUP = os.environ.get("PRODUCTFIX_OCR_WARMUP", "")
+
+_reader_cache = OrderedDict()
+_reader_lock = threading.Lock()
+# 로드 중인 리더 키 -> 로드가 끝나면 set 되는 event (리더 로드는 lock 밖에서 실행)
+_reader_loading = {}
+_reader_stats = {"hits": 0, "misses": 0, "evictions": 0, "loads": 0, "load_time": 0.0}
+
+# 텍스트 마스크 캐시 설정 (MB 단위, 0이면 해당 단계 비활성화)
+MASK_CACHE_MEMORY = env_megabytes("PRODUCTFIX_MASK_CACHE_MEMORY_MB", 256)
+MASK_CACHE_DISK = env_megabytes("PRODUCTFIX_MASK_CACHE_DISK_MB", 1024)
+
+# 검출 설정 (캐시 키에 포함)
+DETECTOR_SETTINGS = {"detect_network": "craft", "canvas_size": 2560, "mag_ratio": 1.0,
+                     "text_threshold": 0.7, "low_text": 0.4, "link_threshold": 0.4, "min_size": 20}
+
+# 검출 모델(CRAFT) 입력 픽셀당 메모리 추정치 (byte, batch chunk 크기 계산에 사용)
+DETECT_MEMORY_PER_PIXEL = 1536
+
+_mask_store = None
+
+# GetTextMask process pool (워커 수, 워커당 스레드 수가 바뀌면 다시 생성)
+_process_pool = None
+_process_pool_config = None
+_process_pool_lock = threading.Lock()
+_spawn_lock = threading.Lock()
 
 language_map = {
     "English": "en",
@@ -59,44 +106,380 @@ def get_languages():
     """
     return [f"{key}/{value}" for key, value in language_map.items()]
 
-def get_text_mask(image: torch.Tensor, languages: List):
+def get_model_dir():
+    """
+    EasyOCR 모델 디렉토리를 반환합니다. (없으면 생성)
+    """
+    model_dir = os.path.join(folder_paths.models_dir, "EasyOCR")
+    if not os.path.exists(model_dir): os.makedirs(model_dir)
+    return model_dir
+
+def normalize_languages(languages: List):
+    """
+    언어 코드 리스트를 공백 제거, 중복 제거 후 정렬된 튜플로 정규화합니다.
+    """
+    return tuple(sorted({lang.strip() for lang in languages if lang.strip()}))
+
+def get_reader(languages: List, device: torch.device = None, recognizer: bool = True):
+    """
+    정규화된 언어 조합과 디바이스를 키로 캐시된 EasyOCR 리더를 반환합니다.
+    캐시가 가득 차면 가장 오래 사용되지 않은 리더를 제거합니다. (LRU)
+
+    Args:
+        languages (List): 언어 코드 리스트
+        device (torch.device, optional): 리더를 실행할 디바이스 (기본값: ComfyUI torch device)
+        recognizer (bool): 인식 모델까지 로드할지 여부 (False면 검출 모델만 로드)
+
+    Returns:
+        easyocr.Reader: 캐시되었거나 새로 로드된 리더
+    """
+    if device is None:
+        device = model_management.get_torch_device()
+    device = torch.device(device)
+    languages = normalize_languages(languages)
+
+    # 검출만 필요한 경우 인식 모델이 포함된 리더도 재사용 가능
+    candidates = [(languages, str(device), True)]
+    if not recognizer:
+        candidates.append((languages, str(device), False))
+
+    while True:
+        with _reader_lock:
+            for key in candidates:
+                reader = _reader_cache.get(key, None)
+                if reader is not None:
+                    _reader_cache.move_to_end(key)
+                    _reader_stats["hits"] += 1
+                    return reader
+
+            # 같은 리더를 다른 스레드(warmup 등)가 로드 중이면 끝날 때까지 기다린 뒤 캐시를 다시 확인
+            loading = next((_reader_loading[key] for key in candidates if key in _reader_loading), None)
+            if loading is None:
+                _reader_stats["misses"] += 1
+                key = candidates[-1]
+                loading = _reader_loading[key] = threading.Event()
+                break
+        loading.wait()
+
+    # 캐시에 없는 경우 리더를 새로 로드
+    # (수 초 ~ 수 분 걸리므로 lock 밖에서 실행하여 다른 언어 조합의 캐시 hit와 통계 조회를 막지 않음)
+    try:
+        start = time.perf_counter()
+        reader = load_reader(languages, device, get_model_dir(), recognizer=recognizer)
+        elapsed = time.perf_counter() - start
+        profiling.record_time("ocr_reader_load", elapsed)
+        logging.info(f"\033[94m[middlek ocr] EasyOCR reader {key} is loaded in {elapsed:.2f}s\033[0m")
+
+        with _reader_lock:
+            _reader_stats["loads"] += 1
+            _reader_stats["load_time"] += elapsed
+            if READER_CACHE_SIZE > 0:
+                _reader_cache[key] = reader
+                while len(_reader_cache) > READER_CACHE_SIZE:
+                    _reader_cache.popitem(last=False)
+                    _reader_stats["evictions"] += 1
+    finally:
+        # 로드에 실패해도 기다리는 스레드가 다시 시도할 수 있도록 해제
+        with _reader_lock:
+            _reader_loading.pop(key, None)
+        loading.set()
+
+    return reader
+
+def get_reader_stats():
+    """
+    리더 캐시의 hit/miss/eviction 횟수, 누적 로드 시간, 캐시된 키 목록을 반환합니다.
+    """
+    with _reader_lock:
+        stats = dict(_reader_stats)
+        stats["cached"] = list(_reader_cache.keys())
+    return stats
+
+def clear_reader_cache():
+    """
+    캐시된 모든 리더를 제거합니다.
+    """
+    with _reader_lock:
+        _reader_cache.clear()
+
+def warmup_readers(language_sets: List = None, device: torch.device = None):
+    """
+    주어진 언어 조합들의 리더를 미리 로드합니다.
+    language_sets가 없으면 PRODUCTFIX_OCR_WARMUP 환경 변수(";"로 조합, ","로 언어 구분)를 사용합니다.
+    """
+    if language_sets is None:
+        language_sets = [cur.split(",") for cur in READER_WARMUP.split(";") if cur.strip()]
+    for languages in language_sets[:max(READER_CACHE_SIZE, 1)]:
+        try:
+            get_reader(languages, device)
+        except Exception as e:
+            logging.warning(f"[middlek ocr] EasyOCR reader warmup failed for {languages}: {e}")
+
+def start_reader_warmup():
+    """
+    PRODUCTFIX_OCR_WARMUP이 설정된 경우 백그라운드 스레드에서 리더를 미리 로드합니다.
+    """
+    if not READER_WARMUP.strip():
+        return None
+    thread = threading.Thread(target=warmup_readers, name="productfix-ocr-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def rasterize_polygons(polygons: List, height: int, width: int, dtype: torch.dtype = torch.float32, device: torch.device = None):
+    """
+    배치 전체의 텍스트 영역 꼭짓점을 하나의 마스크 텐서에 채웁니다.
+    미리 할당한 (B, H, W) 버퍼에 그린 뒤 한 번에 텐서로 변환합니다.
+
+    Args:
+        polygons (List): 이미지별 텍스트 영역 꼭짓점 리스트
+        height (int): 마스크 높이
+        width (int): 마스크 너비
+        dtype (torch.dtype): torch.bool, torch.uint8 (0/255) 또는 float 계열 (0~1)
+        device (torch.device, optional): 결과 마스크 디바이스 (기본값: cpu)
+
+    Returns:
+        torch.Tensor: 텍스트 영역 마스크 (B, 1, H, W)
+    """
+    masks = np.zeros([len(polygons), height, width], dtype=np.uint8)
+
+    for mask, cur_polygons in zip(masks, polygons):
+        fill_polygons(mask, cur_polygons)
+
+    # uint8 상태로 디바이스에 옮긴 뒤 변환 (전송량 최소화)
+    masks = torch.from_numpy(masks).to(device=device if device is not None else "cpu").unsqueeze(1)
+    if dtype == torch.bool:
+        return masks != 0
+    if dtype == torch.uint8:
+        return masks
+    return masks.to(dtype=dtype).div_(255.0)
+
+def get_detect_memory(height: int, width: int, max_pixels: int = 0):
+    """
+    텍스트 검출에서 이미지 한 장을 처리하는 데 필요한 메모리 추정치 (byte)를 반환합니다.
+    검출 모델은 긴 변을 mag_ratio 배 (최대 canvas_size)로 리사이즈한 입력을 사용합니다.
+    """
+    if max_pixels > 0 and height * width > max_pixels:
+        # tile 또는 축소 이미지 단위로 검출
+        scale = (max_pixels / (height * width)) ** 0.5
+        height, width = max(int(height * scale), 1), max(int(width * scale), 1)
+    long_side = max(height, width)
+    ratio = min(DETECTOR_SETTINGS["mag_ratio"] * long_side, DETECTOR_SETTINGS["canvas_size"]) / long_side
+    return int(height * width * ratio * ratio * DETECT_MEMORY_PER_PIXEL)
+
+def get_mask_store():
+    """
+    텍스트 마스크 캐시를 반환합니다. (마스크는 bit-pack 형식으로 디스크에 저장)
+    """
+    global _mask_store
+    if _mask_store is None:
+        _mask_store = TensorStore("text_mask", get_cache_dir("text_mask"),
+                                  memory_limit=MASK_CACHE_MEMORY, disk_limit=MASK_CACHE_DISK, codec="bits")
+    return _mask_store
+
+def get_mask_cache_stats():
+    """
+    텍스트 마스크 캐시 통계를 반환합니다.
+    """
+    return get_mask_store().stats()
+
+def get_process_pool(workers: int = 0, threads_per_worker: int = 0):
+    """
+    GetTextMask용 persistent process pool을 반환합니다.
+    각 워커는 CPU에서 실행되며 자신의 EasyOCR 리더 캐시를 유지합니다.
+    워커는 ComfyUI 모듈 없이 text_detect만 불러오며, ComfyUI main.py를 다시 실행하지 않습니다. (_without_main_module)
+
+    Args:
+        workers (int): 워커 프로세스 수 (0이면 CPU 코어 수 기준 자동, 최대 4)
+        threads_per_worker (int): 워커당 torch/OpenCV 스레드 수 (0이면 코어를 워커 수로 나눈 값)
+
+    Returns:
+        Tuple[ProcessPoolExecutor, int]: process pool과 워커 수
+    """
+    global _process_pool, _process_pool_config
+    cpu_count = os.cpu_count() or 1
+    if workers <= 0:
+        workers = min(cpu_count, 4)
+    if threads_per_worker <= 0:
+        threads_per_worker = max(cpu_count // workers, 1)
+
+    with _process_pool_lock:
+        if _process_pool is not None and _process_pool_config != (workers, threads_per_worker):
+            _process_pool.shutdown(wait=True)
+            _process_pool = None
+
+        if _process_pool is None:
+            # 워커가 top-level 모듈로 import 할 수 있도록 패키지 디렉토리를 sys.path에 추가
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            if package_dir not in sys.path:
+                sys.path.append(package_dir)
+            worker = importlib.import_module("ocr_worker")
+
+            _process_pool = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=worker.initialize,
+                                                initargs=(package_dir, get_model_dir(), threads_per_worker))
+            _process_pool_config = (workers, threads_per_worker)
+            logging.info(f"\033[94m[middlek ocr] process pool is started (workers={workers}, threads={threads_per_worker})\033[0m")
+
+    return _process_pool, workers
+
+def shutdown_process_pool():
+    """
+    GetTextMask process pool을 종료합니다.
+    """
+    global _process_pool, _process_pool_config
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+            _process_pool_config = None
+
+atexit.register(shutdown_process_pool)
+
+@contextlib.contextmanager
+def _without_main_module():
+    """
+    spawn 워커가 부모 프로세스의 __main__을 다시 실행하지 않도록 __main__의 파일/모듈 정보를 잠시 숨깁니다.
+
+    multiprocessing spawn은 워커에서 부모의 __main__ (ComfyUI main.py)을 __mp_main__으로 다시 실행하므로
+    워커마다 경로 설정, custom node prestartup 스크립트, server/nodes import가 반복됩니다.
+    워커 작업(ocr_worker)은 __main__에 정의된 것을 사용하지 않으므로 워커를 시작하는 동안
+    (ProcessPoolExecutor는 submit에서 워커를 시작) __file__, __spec__을 숨겨 다시 실행하지 않게 합니다.
+    """
+    main_module = sys.modules.get("__main__", None)
+    with _spawn_lock:
+        if main_module is None:
+            yield
+            return
+        saved = {name: main_module.__dict__[name] for name in ("__file__", "__spec__") if name in main_module.__dict__}
+        main_module.__dict__.pop("__file__", None)
+        main_module.__spec__ = None
+        try:
+            yield
+        finally:
+            main_module.__dict__.pop("__spec__", None)
+            main_module.__dict__.update(saved)
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    # 워커가 비정상 종료되어 (OOM kill 등) 사용할 수 없게 된 pool을 버림 (다음 get_process_pool에서 새로 시작)
+    global _process_pool, _process_pool_config
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+            _process_pool_config = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _compute_text_mask_sharded(image: torch.Tensor, languages: List, mode: str, max_pixels: int, tiling: str,
+                               workers: int, threads_per_worker: int):
+    """
+    배치를 process pool 워커들에 나누어 텍스트 마스크를 생성합니다.
+    이미지와 마스크는 pickle 대신 공유 메모리로 주고 받으며, 마스크는 배치 순서대로 채워집니다.
+    """
+    b, h, w, c = image.shape
+
+    image = image.to("cpu", dtype=torch.float32).contiguous()
+    image_shm = shared_memory.SharedMemory(create=True, size=image.numel() * image.element_size())
+    mask_shm = shared_memory.SharedMemory(create=True, size=b * h * w)
+    try:
+        images = np.ndarray((b, h, w, c), dtype=np.float32, buffer=image_shm.buf)
+        images[:] = image.numpy()
+        masks = np.ndarray((b, h, w), dtype=np.uint8, buffer=mask_shm.buf)
+
+        # 워커가 비정상 종료되어 pool이 깨지면 pool을 새로 시작해서 한 번 더 실행
+        for attempt in range(2):
+            pool, pool_workers = get_process_pool(workers, threads_per_worker)
+            worker = importlib.import_module("ocr_worker")
+            masks[:] = 0
+            # 연속된 인덱스 단위로 워커에 분배
+            shards = [cur.tolist() for cur in np.array_split(np.arange(b), min(pool_workers, b)) if len(cur) > 0]
+            try:
+                with _without_main_module():
+                    futures = [pool.submit(worker.detect_shard, image_shm.name, mask_shm.name, (b, h, w, c), shard,
+                                           list(languages), mode, max_pixels, tiling)
+                               for shard in shards]
+                for future in futures:
+                    future.result()
+                break
+            except BrokenProcessPool:
+                _discard_process_pool(pool)
+                if attempt == 1:
+                    raise
+                logging.warning("[middlek ocr] process pool worker terminated abruptly, restarting the pool and retrying.")
+
+        text_masks = torch.from_numpy(masks.copy()).unsqueeze(1) != 0
+        del images, masks
+    finally:
+        image_shm.close()
+        image_shm.unlink()
+        mask_shm.close()
+        mask_shm.unlink()
+
+    return text_masks
+
+def _compute_text_mask(image: torch.Tensor, languages: List, mode: str, max_pixels: int = 0, tiling: str = "tile",
+                       execution: str = "in-process", workers: int = 0, threads_per_worker: int = 0):
+    b, h, w, c = image.shape
+
+    if execution == "process pool":
+        return _compute_text_mask_sharded(image, languages, mode, max_pixels, tiling, workers, threads_per_worker)
+
+    # 캐시된 EasyOCR 리더로 텍스트 감지
+    # (배치는 사용 가능한 메모리에 맞는 chunk로 나누어 검출하고, 마스크는 미리 할당한 출력에 채움)
+    reader = get_reader(languages, recognizer=(mode == "readtext"))
+
+    def detect_fn(start, end):
+        profiling.record_tensor_transfer(image[start:end], "cpu")
+        if max_pixels > 0 and h * w > max_pixels:
+            results = detect_text_polygons_tiled(reader, image[start:end], mode, max_pixels, tiling)
+        else:
+            # 이미지 전처리
+            results = detect_text_polygons(reader, image[start:end].to("cpu").numpy() * 255.0, mode)
+        # 감지된 텍스트 영역을 배치 마스크로 변환
+        return rasterize_polygons(results, h, w, dtype=torch.bool)
+
+    text_masks = torch.empty((b, 1, h, w), dtype=torch.bool)
+    return run_chunked(detect_fn, b, get_detect_memory(h, w, max_pixels), model_management.get_torch_device(),
+                       out=text_masks, name="ocr")
+
+def get_text_mask(image: torch.Tensor, languages: List, mode: str = "detect", use_cache: bool = True,
+                  max_pixels: int = 0, tiling: str = "tile", execution: str = "in-process",
+                  workers: int = 0, threads_per_worker: int = 0):
     """
     주어진 이미지에서 텍스트 영역을 감지하고 마스크를 생성합니다.
 
     Args:
         image (torch.Tensor): 입력 이미지 텐서 (B, H, W, C)
         languages (List): 감지할 언어 코드 리스트
+        mode (str): "detect"는 검출 모델만 실행, "readtext"는 인식 모델까지 실행
+        use_cache (bool): 이미지 digest, 언어, 검출 설정 기준으로 캐시된 마스크 사용 여부
+        max_pixels (int): 검출 한 번에 사용할 최대 픽셀 수 (0이면 제한 없음)
+        tiling (str): max_pixels를 넘는 이미지 처리 방식 ("tile" 또는 "downscale")
+        execution (str): "in-process" 또는 "process pool" (CPU 워커 프로세스에 배치를 나누어 처리)
+        workers (int): process pool 워커 수 (0이면 자동)
+        threads_per_worker (int): process pool 워커당 스레드 수 (0이면 자동)
 
     Returns:
         torch.Tensor: 텍스트 영역 마스크 (B, 1, H, W)
     """
-    # EasyOCR 모델 디렉토리 설정
-    model_dir = os.path.join(folder_paths.models_dir, "EasyOCR")
-    if not os.path.exists(model_dir): os.makedirs(model_dir)
-
-    # 이미지 전처리
     b, h, w, c = image.shape
-    image = image.to("cpu").numpy() * 255.0
-    
-    # EasyOCR 리더 초기화 및 텍스트 감지
-    reader = easyocr.Reader(languages, model_storage_directory=model_dir)
-    results = reader.readtext_batched(image, batch_size=b)
-    
-    text_masks = []
-    for result in results:
-        # 각 이미지에 대한 텍스트 마스크 생성
-        text_mask = np.zeros([h,w,1], dtype=np.uint8)
-
-        for detection in result:
-            # 감지된 각 텍스트 영역을 마스크에 그리기
-            bbox = detection[0]
-            points = np.array(bbox).reshape((-1, 1, 2)).astype(np.int32)
-            cv2.fillPoly(text_mask, [points], 255)
-        
-        # 마스크를 텐서로 변환하고 정규화
-        text_masks.append(torch.tensor(text_mask, dtype=torch.float32).reshape(1,h,w,1).permute(0,3,1,2) / 255.0)
-    
-    # 모든 마스크를 하나의 텐서로 결합
-    text_masks = torch.cat(text_masks)
-
-    return text_masks
\ No newline at end of file
+    if not (max_pixels > 0 and h * w > max_pixels):
+        max_pixels, tiling = 0, None
+
+    execution_options = {"execution": execution, "workers": workers, "threads_per_worker": threads_per_worker}
+    if not use_cache:
+        return _compute_text_mask(image, languages, mode, max_pixels, tiling, **execution_options).float()
+
+    # 이미지별 캐시 키 생성 후 캐시에 없는 이미지만 OCR 수행
+    store = get_mask_store()
+    settings = (normalize_languages(languages), mode, sorted(DETECTOR_SETTINGS.items()), max_pixels, tiling)
+    keys = [make_key(tensor_digest(cur), settings) for cur in image]
+    text_masks = [store.get(key) for key in keys]
+
+    missing = [i for i, cur in enumerate(text_masks) if cur is None]
+    if len(missing) > 0:
+        computed = _compute_text_mask(image[missing], languages, mode, max_pixels, tiling, **execution_options)
+        for i, text_mask in zip(missing, computed):
+            store.put(keys[i], text_mask)
+            text_masks[i] = text_mask
+
+    return torch.stack(text_masks).float()
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+GetTextMask process pool 워커
+
+spawn 된 워커 프로세스에서 top-level 모듈("ocr_worker")로 import 됩니다.
+ComfyUI가 붙인 패키지 이름은 워커에서 import 할 수 없고, ocr 모듈은 ComfyUI 모듈(comfy.model_management 등)을
+불러오므로, 워커는 ComfyUI에 의존하지 않는 검출 모듈(text_detect)만 top-level 모듈로 불러옵니다.
+"""
+import os
+import sys
+import importlib
+
+_detect = None
+_model_dir = None
+# (언어, 인식 모델 포함 여부) -> 워커의 CPU EasyOCR 리더
+_readers = {}
+
+def initialize(package_dir: str, model_dir: str, num_threads: int):
+    """
+    워커 프로세스 초기화: 스레드 수 제한 후 검출 모듈을 불러옵니다.
+    """
+    global _detect, _model_dir
+
+    # torch import 전에 설정해야 적용되는 스레드 설정
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(num_threads)
+
+    import cv2
+    import torch
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+
+    if package_dir not in sys.path:
+        sys.path.append(package_dir)
+    _detect = importlib.import_module("text_detect")
+    _model_dir = model_dir
+
+def get_reader(languages: list, recognizer: bool):
+    """
+    워커의 CPU EasyOCR 리더를 반환합니다. (검출만 필요한 경우 인식 모델이 포함된 리더도 재사용)
+    """
+    languages = tuple(languages)
+    reader = _readers.get((languages, True), None) or _readers.get((languages, recognizer), None)
+    if reader is None:
+        reader = _readers[(languages, recognizer)] = _detect.load_reader(languages, "cpu", _model_dir, recognizer)
+    return reader
+
+def detect_shard(image_name: str, mask_name: str, shape: tuple, indices: list, languages: list, mode: str,
+                 max_pixels: int, tiling: str):
+    """
+    공유 메모리의 이미지 배치 중 indices에 해당하는 이미지의 텍스트 마스크를 공유 메모리 출력 버퍼에 씁니다.
+
+    Args:
+        image_name (str): 입력 이미지 (B, H, W, C) float32 공유 메모리 이름
+        mask_name (str): 출력 마스크 (B, H, W) uint8 공유 메모리 이름
+        shape (tuple): 입력 이미지 배치 shape
+        indices (list): 이 워커가 처리할 배치 인덱스
+
+    Returns:
+        int: 처리한 이미지 수
+    """
+    import numpy as np
+    import torch
+    from multiprocessing import shared_memory
+
+    b, h, w, c = shape
+    image_shm = shared_memory.SharedMemory(name=image_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    try:
+        images = np.ndarray(shape, dtype=np.float32, buffer=image_shm.buf)
+        masks = np.ndarray((b, h, w), dtype=np.uint8, buffer=mask_shm.buf)
+
+        reader = get_reader(languages, recognizer=(mode == "readtext"))
+        if max_pixels > 0 and h * w > max_pixels:
+            polygons = _detect.detect_text_polygons_tiled(reader, torch.from_numpy(images[indices]), mode, max_pixels, tiling)
+        else:
+            polygons = _detect.detect_text_polygons(reader, images[indices] * 255.0, mode)
+
+        for i, cur_polygons in zip(indices, polygons):
+            _detect.fill_polygons(masks[i], cur_polygons)
+
+        # 공유 메모리를 닫기 전에 버퍼 참조 해제
+        del images, masks
+    finally:
+        image_shm.close()
+        mask_shm.close()
+
+    return len(indices)
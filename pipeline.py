@@ -0,0 +1,231 @@
+"""
+상품 이미지 카탈로그 전처리 파이프라인
+
+디렉토리 또는 manifest의 이미지를 스트리밍으로 읽어서
+DynamicImageResize -> GetTextMask -> VQEncoder와 같은 처리를 한 뒤 결과를 디스크에 바로 씁니다.
+- 이미지는 백그라운드 스레드에서 디코딩하며, 미리 읽는 이미지 수는 prefetch로 제한
+- 리사이즈 후 크기가 같은 이미지끼리 micro-batch로 묶어서 처리
+- 결과(마스크 PNG, latent .npy)와 manifest.jsonl을 배치마다 기록하므로 중단 후 다시 실행하면 이어서 처리
+"""
+import os
+import json
+import time
+import logging
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+import torch
+import numpy as np
+from PIL import Image, ImageOps
+
+from .resize import dynamic_resize
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+MANIFEST_NAME = "manifest.jsonl"
+
+class CatalogItem:
+    """
+    카탈로그 이미지 하나 (id는 출력 파일 이름으로 사용)
+    """
+    def __init__(self, item_id: str, path: str):
+        self.id = item_id
+        self.path = path
+        self.image = None
+
+def iter_catalog(source: str) -> Iterator[CatalogItem]:
+    """
+    디렉토리(하위 디렉토리 포함) 또는 manifest 파일의 이미지를 순서대로 반환합니다.
+    manifest는 한 줄에 경로 하나인 텍스트 파일이거나, "path"(와 선택적으로 "id")를 가진 JSON lines 파일입니다.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, file)
+                    item_id = os.path.splitext(os.path.relpath(path, source))[0].replace(os.sep, "__")
+                    yield CatalogItem(item_id, path)
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                path = record["path"]
+                item_id = record.get("id", None)
+            else:
+                path, item_id = line, None
+            path = path if os.path.isabs(path) else os.path.join(base_dir, path)
+            if item_id is None:
+                item_id = os.path.splitext(os.path.basename(path))[0]
+            yield CatalogItem(str(item_id), path)
+
+def load_image(path: str):
+    """
+    이미지 파일을 IMAGE (1, H, W, 3) 텐서로 읽습니다. (EXIF 회전 적용)
+    """
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        array = np.asarray(image, dtype=np.float32) / 255.0
+    return torch.from_numpy(array).unsqueeze(0)
+
+def iter_decoded(items: Iterator[CatalogItem], threads: int = 4, prefetch: int = 16):
+    """
+    이미지를 백그라운드 스레드에서 디코딩하며 순서대로 반환합니다.
+    동시에 디코딩 중이거나 대기 중인 이미지는 prefetch개 이하로 유지합니다.
+    읽지 못한 이미지는 경고를 남기고 건너뜁니다.
+    """
+    pending = deque()
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="productfix_decode") as executor:
+        while True:
+            while len(pending) < max(1, prefetch):
+                item = next(items, None)
+                if item is None:
+                    break
+                pending.append((item, executor.submit(load_image, item.path)))
+            if len(pending) == 0:
+                return
+
+            item, future = pending.popleft()
+            try:
+                item.image = future.result()
+            except Exception as e:
+                logging.warning(f"[middlek pipeline] failed to read {item.path}: {e}")
+                continue
+            yield item
+
+def iter_batches(items: Iterator[CatalogItem], batch_size: int = 8, max_pending: int = 0):
+    """
+    크기가 같은 이미지끼리 micro-batch로 묶어서 반환합니다.
+    대기 중인 이미지 수가 max_pending(기본값: batch_size * 4)을 넘으면 가장 많이 모인 크기부터 내보냅니다.
+    """
+    if max_pending <= 0:
+        max_pending = batch_size * 4
+
+    buckets = OrderedDict()
+    num_pending = 0
+    for item in items:
+        bucket = buckets.setdefault(tuple(item.image.shape[1:]), [])
+        bucket.append(item)
+        num_pending += 1
+
+        if len(bucket) >= batch_size:
+            yield buckets.pop(tuple(item.image.shape[1:]))
+            num_pending -= batch_size
+        elif num_pending > max_pending:
+            key = max(buckets, key=lambda cur: len(buckets[cur]))
+            flushed = buckets.pop(key)
+            num_pending -= len(flushed)
+            yield flushed
+
+    for bucket in buckets.values():
+        yield bucket
+
+def read_done_ids(output_dir: str):
+    """
+    이전 실행에서 처리 완료된 이미지 id를 manifest.jsonl에서 읽습니다.
+    """
+    done = set()
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    # 중단되어 마지막 줄이 잘린 경우
+                    continue
+    return done
+
+def _write_outputs(output_dir: str, items: List[CatalogItem], images: torch.Tensor, masks: torch.Tensor, latents: torch.Tensor,
+                   save_images: bool):
+    # 배치 결과를 파일로 쓰고 manifest에 기록할 레코드를 반환
+    records = []
+    for i, item in enumerate(items):
+        record = {"id": item.id, "source": item.path, "height": images.shape[1], "width": images.shape[2]}
+        if save_images:
+            record["image"] = os.path.join("images", item.id + ".png")
+            array = (images[i].numpy() * 255.0).round().astype(np.uint8)
+            Image.fromarray(array).save(os.path.join(output_dir, record["image"]))
+        if masks is not None:
+            record["mask"] = os.path.join("masks", item.id + ".png")
+            array = (masks[i, 0].numpy() * 255.0).round().astype(np.uint8)
+            Image.fromarray(array).save(os.path.join(output_dir, record["mask"]))
+        if latents is not None:
+            record["latent"] = os.path.join("latents", item.id + ".npy")
+            np.save(os.path.join(output_dir, record["latent"]), latents[i].numpy())
+        records.append(record)
+    return records
+
+def run_catalog(source: str, output_dir: str, vq=None, languages: List = None, max_pixels: int = 1024*1024,
+                min_pixels: int = 512*512, method: str = "lanczos", snap: str = "64", batch_size: int = 8,
+                threads: int = 4, prefetch: int = 16, text_mask_mode: str = "detect", save_images: bool = False,
+                resume: bool = True):
+    """
+    카탈로그 이미지를 리사이즈하고 텍스트 마스크와 VQ latent를 만들어 output_dir에 씁니다.
+
+    Args:
+        source (str): 이미지 디렉토리 또는 manifest 파일 경로
+        output_dir (str): 출력 디렉토리 (images/, masks/, latents/, manifest.jsonl)
+        vq (VQ, optional): VQ 모델 (없으면 latent를 만들지 않음)
+        languages (List, optional): 텍스트 마스크 언어 코드 리스트 (없으면 마스크를 만들지 않음)
+        max_pixels (int): 리사이즈 최대 픽셀 수
+        min_pixels (int): 리사이즈 최소 픽셀 수
+        method (str): 리사이즈 방법 (resize.RESIZE_METHODS)
+        snap (str): 출력 크기 맞춤 방식 (resize.SNAP_MODES)
+        batch_size (int): micro-batch 크기
+        threads (int): 디코딩 스레드 수
+        prefetch (int): 미리 디코딩할 최대 이미지 수
+        text_mask_mode (str): GetTextMask 실행 방식 ("detect" 또는 "readtext")
+        save_images (bool): 리사이즈한 이미지도 저장할지 여부
+        resume (bool): manifest.jsonl에 기록된 이미지는 건너뜀
+
+    Returns:
+        dict: 처리한 이미지 수, 건너뛴 이미지 수, 실행 시간
+    """
+    from .ocr import get_text_mask
+    from .vq import vqmodel_encode
+
+    for name, enabled in (("images", save_images), ("masks", languages), ("latents", vq is not None)):
+        if enabled:
+            os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+
+    done = read_done_ids(output_dir) if resume else set()
+    stats = {"processed": 0, "skipped": 0, "batches": 0}
+
+    def pending_items():
+        for item in iter_catalog(source):
+            if item.id in done:
+                stats["skipped"] += 1
+                continue
+            yield item
+
+    def resized_items():
+        for item in iter_decoded(pending_items(), threads=threads, prefetch=prefetch):
+            item.image = dynamic_resize(item.image, max_pixels=max_pixels, min_pixels=min_pixels, method=method, snap=snap)
+            yield item
+
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, MANIFEST_NAME), "a" if resume else "w", encoding="utf-8") as manifest:
+        for items in iter_batches(resized_items(), batch_size=batch_size):
+            images = torch.cat([item.image for item in items])
+            masks = get_text_mask(images, languages, mode=text_mask_mode, use_cache=False).cpu() if languages else None
+            latents = vqmodel_encode(images, vq, tiled="auto").float().cpu() if vq is not None else None
+
+            for record in _write_outputs(output_dir, items, images, masks, latents, save_images):
+                manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+            stats["processed"] += len(items)
+            stats["batches"] += 1
+            elapsed = time.perf_counter() - start
+            logging.info(f"[middlek pipeline] {stats['processed']} images ({stats['processed'] / elapsed:.2f} images/s), "
+                         f"last batch {len(items)}x{images.shape[1]}x{images.shape[2]}")
+
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
@@ -0,0 +1,258 @@
+"""
+productfix 노드 프로파일링
+
+PRODUCTFIX_PROFILE=1 이면 노드 실행마다 실행 시간, 디바이스 전송 횟수와 byte 수, 최대 할당 메모리(CUDA)를 기록하고
+latent injection이 적용된 sampling step이 injection 구간 안/밖에서 실행된 횟수를 셉니다.
+PRODUCTFIX_PROFILE_STEPS=1 이면 latent injection step 별 실행 시간도 기록합니다. (step 마다 디바이스 동기화)
+
+노드 실행 기록은 JSON 한 줄로 로그에 남기며, PRODUCTFIX_PROFILE_DIR이 설정되면
+profile.jsonl에 추가하고 metrics.prom에 Prometheus text 형식의 누적 통계를 씁니다.
+비활성화 상태에서는 노드를 감싸지 않으며, 기록 함수는 바로 반환합니다.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from collections import deque
+from functools import wraps
+import torch
+from comfy import model_management
+
+def _env_flag(name: str):
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "off")
+
+PROFILE_ENABLED = _env_flag("PRODUCTFIX_PROFILE")
+PROFILE_STEPS = PROFILE_ENABLED and _env_flag("PRODUCTFIX_PROFILE_STEPS")
+PROFILE_DIR = os.environ.get("PRODUCTFIX_PROFILE_DIR", "")
+
+# 최근 step 실행 시간 (초)
+STEP_HISTORY = 1024
+
+_lock = threading.Lock()
+_local = threading.local()
+_node_stats = {}
+_sampler_stats = {"steps_inside": 0, "steps_outside": 0, "timed_steps": 0, "step_time": 0.0, "max_step_time": 0.0}
+_step_times = deque(maxlen=STEP_HISTORY)
+
+def _current_call():
+    return getattr(_local, "call", None)
+
+def record_transfer(nbytes: int, count: int = 1):
+    """
+    실행 중인 노드 기록에 디바이스 전송을 추가합니다.
+    """
+    if not PROFILE_ENABLED:
+        return
+    call = _current_call()
+    if call is not None:
+        call["transfers"] += count
+        call["transfer_bytes"] += int(nbytes)
+
+def record_tensor_transfer(tensor: torch.Tensor, device: torch.device):
+    """
+    tensor를 device로 옮기는 경우 (디바이스 종류가 다른 경우) 전송으로 기록합니다.
+    """
+    if not PROFILE_ENABLED or tensor is None:
+        return
+    if tensor.device.type != torch.device(device).type:
+        record_transfer(tensor.numel() * tensor.element_size())
+
+def record_time(name: str, seconds: float):
+    """
+    실행 중인 노드 기록에 세부 작업 시간을 추가합니다. (예: OCR 리더 로드, VQ 모델 디바이스 이동)
+    """
+    if not PROFILE_ENABLED:
+        return
+    call = _current_call()
+    if call is not None:
+        call["timings"][name] = call["timings"].get(name, 0.0) + seconds
+
+def record_sampler_step(in_window: torch.Tensor = None):
+    """
+    latent injection sampling step 하나를 injection 구간 안/밖으로 나누어 셉니다.
+    (배치 항목 중 하나라도 구간 안이면 안으로 셈, GPU에서는 host 동기화 발생)
+    """
+    if not PROFILE_ENABLED:
+        return
+    inside = in_window is not None and bool(in_window.any())
+    with _lock:
+        _sampler_stats["steps_inside" if inside else "steps_outside"] += 1
+
+@contextlib.contextmanager
+def step_timer(device: torch.device):
+    """
+    sampling step 하나의 실행 시간을 기록합니다. (PRODUCTFIX_PROFILE_STEPS)
+    """
+    if not PROFILE_STEPS:
+        yield
+        return
+    _synchronize(device)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _synchronize(device)
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _sampler_stats["timed_steps"] += 1
+            _sampler_stats["step_time"] += elapsed
+            _sampler_stats["max_step_time"] = max(_sampler_stats["max_step_time"], elapsed)
+            _step_times.append(elapsed)
+
+def _synchronize(device: torch.device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def profile_node(name: str):
+    """
+    노드 함수의 실행 시간, 디바이스 전송, 최대 할당 메모리를 기록하는 decorator
+    프로파일링이 비활성화되어 있으면 함수를 그대로 반환합니다.
+    """
+    def decorator(fn):
+        if not PROFILE_ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            device = model_management.get_torch_device()
+            cuda = device.type == "cuda"
+            if cuda:
+                torch.cuda.synchronize(device)
+                torch.cuda.reset_peak_memory_stats(device)
+                base_memory = torch.cuda.memory_allocated(device)
+
+            call = {"node": name, "wall_time": 0.0, "transfers": 0, "transfer_bytes": 0, "timings": {}}
+            parent, _local.call = _current_call(), call
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                call["error"] = type(e).__name__
+                raise
+            finally:
+                if cuda:
+                    torch.cuda.synchronize(device)
+                    call["peak_memory"] = torch.cuda.max_memory_allocated(device)
+                    call["peak_memory_delta"] = call["peak_memory"] - base_memory
+                call["wall_time"] = time.perf_counter() - start
+                _local.call = parent
+                _finish_call(call)
+
+        return wrapper
+    return decorator
+
+def instrument_nodes(node_class_mappings: dict):
+    """
+    NODE_CLASS_MAPPINGS의 모든 노드 함수(FUNCTION)를 profile_node로 감쌉니다. (비활성화 상태면 아무것도 하지 않음)
+    """
+    if not PROFILE_ENABLED:
+        return
+    for name, cls in node_class_mappings.items():
+        fn = getattr(cls, cls.FUNCTION)
+        if getattr(fn, "_productfix_profiled", False):
+            continue
+        wrapper = profile_node(name)(fn)
+        wrapper._productfix_profiled = True
+        setattr(cls, cls.FUNCTION, wrapper)
+    logging.info(f"\033[94m[middlek profile] profiling is enabled for {len(node_class_mappings)} nodes\033[0m")
+
+def _finish_call(call: dict):
+    # 노드별 누적 통계 갱신 후 기록 출력
+    with _lock:
+        stats = _node_stats.setdefault(call["node"], {"calls": 0, "errors": 0, "wall_time": 0.0, "transfers": 0,
+                                                     "transfer_bytes": 0, "peak_memory": 0, "timings": {}})
+        stats["calls"] += 1
+        stats["errors"] += int("error" in call)
+        stats["wall_time"] += call["wall_time"]
+        stats["transfers"] += call["transfers"]
+        stats["transfer_bytes"] += call["transfer_bytes"]
+        stats["peak_memory"] = max(stats["peak_memory"], call.get("peak_memory", 0))
+        for key, value in call["timings"].items():
+            stats["timings"][key] = stats["timings"].get(key, 0.0) + value
+
+    record = dict(call, time=time.time())
+    line = json.dumps(record, ensure_ascii=False)
+    logging.info(f"[middlek profile] {line}")
+    if PROFILE_DIR:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, "profile.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            write_prometheus_snapshot(os.path.join(PROFILE_DIR, "metrics.prom"))
+        except OSError as e:
+            logging.warning(f"[middlek profile] failed to write profile to {PROFILE_DIR}: {e}")
+
+def get_profile_stats():
+    """
+    노드별 누적 통계, sampler step 통계, 최근 step 실행 시간을 반환합니다.
+    """
+    with _lock:
+        return {"nodes": {name: dict(stats, timings=dict(stats["timings"])) for name, stats in _node_stats.items()},
+                "sampler": dict(_sampler_stats),
+                "step_times": list(_step_times)}
+
+def reset_profile_stats():
+    """
+    누적 통계를 초기화합니다.
+    """
+    with _lock:
+        _node_stats.clear()
+        for key in _sampler_stats:
+            _sampler_stats[key] = type(_sampler_stats[key])()
+        _step_times.clear()
+
+def get_prometheus_snapshot():
+    """
+    누적 통계를 Prometheus text exposition 형식 문자열로 반환합니다.
+    """
+    stats = get_profile_stats()
+    metrics = [
+        ("productfix_node_calls_total", "counter", "Number of node calls", "calls"),
+        ("productfix_node_errors_total", "counter", "Number of node calls that raised", "errors"),
+        ("productfix_node_wall_seconds_total", "counter", "Total node wall time", "wall_time"),
+        ("productfix_node_transfers_total", "counter", "Number of device transfers in node calls", "transfers"),
+        ("productfix_node_transfer_bytes_total", "counter", "Bytes transferred between devices in node calls", "transfer_bytes"),
+        ("productfix_node_peak_memory_bytes", "gauge", "Max peak allocated device memory of a node call", "peak_memory"),
+    ]
+    lines = []
+    for metric, kind, help_text, key in metrics:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{node="{name}"}} {node[key]}' for name, node in sorted(stats["nodes"].items())]
+
+    lines += ["# HELP productfix_node_section_seconds_total Total time of sections inside node calls",
+              "# TYPE productfix_node_section_seconds_total counter"]
+    lines += [f'productfix_node_section_seconds_total{{node="{name}",section="{section}"}} {value}'
+              for name, node in sorted(stats["nodes"].items()) for section, value in sorted(node["timings"].items())]
+
+    sampler = stats["sampler"]
+    lines += ["# HELP productfix_sampler_steps_total Latent injection sampling steps by injection window",
+              "# TYPE productfix_sampler_steps_total counter",
+              f'productfix_sampler_steps_total{{window="inside"}} {sampler["steps_inside"]}',
+              f'productfix_sampler_steps_total{{window="outside"}} {sampler["steps_outside"]}',
+              "# HELP productfix_sampler_step_seconds Latent injection sampling step time (PRODUCTFIX_PROFILE_STEPS)",
+              "# TYPE productfix_sampler_step_seconds summary",
+              f'productfix_sampler_step_seconds_sum {sampler["step_time"]}',
+              f'productfix_sampler_step_seconds_count {sampler["timed_steps"]}',
+              "# HELP productfix_sampler_step_seconds_max Slowest latent injection sampling step",
+              "# TYPE productfix_sampler_step_seconds_max gauge",
+              f'productfix_sampler_step_seconds_max {sampler["max_step_time"]}']
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_snapshot(path: str):
+    """
+    Prometheus text 형식 누적 통계를 파일로 씁니다. (node exporter textfile collector 등에서 읽는 도중 바뀌지 않도록 교체)
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(get_prometheus_snapshot())
+    os.replace(tmp_path, path)
+
+def write_json_snapshot(path: str):
+    """
+    누적 통계를 JSON 파일로 씁니다.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_profile_stats(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,144 @@
+import math
+from typing import List
+import torch
+import torch.nn.functional as F
+from comfy import model_management
+from comfy.utils import lanczos as comfy_lanczos_resize
+
+RESIZE_METHODS = ["lanczos", "bicubic", "bilinear", "area"]
+SNAP_MODES = ["none", "8", "64", "bucket"]
+
+# "bucket" 모드의 가로:세로 비율 목록 (크기는 64의 배수로 맞춤)
+ASPECT_BUCKETS = [(1, 1), (5, 4), (4, 5), (4, 3), (3, 4), (3, 2), (2, 3), (16, 9), (9, 16), (2, 1), (1, 2)]
+
+def _snap(value: float, multiple: int):
+    return max(multiple, int(round(value / multiple)) * multiple)
+
+def get_target_size(height: int, width: int, max_pixels: int, min_pixels: int, snap: str = "none"):
+    """
+    픽셀 수 범위와 snap 설정에 맞는 resize 크기를 계산합니다.
+
+    Args:
+        height (int): 원본 높이
+        width (int): 원본 너비
+        max_pixels (int): 최대 픽셀 수
+        min_pixels (int): 최소 픽셀 수
+        snap (str): "none"은 비율 유지, "8"/"64"는 해당 배수, "bucket"은 가장 가까운 ASPECT_BUCKETS 비율 (64의 배수)
+
+    Returns:
+        tuple: (높이, 너비)
+    """
+    ratio = height / width
+    pixels = min(max(height * width, min_pixels), max_pixels)
+
+    if snap == "none":
+        # 기존 dynamic_resize와 같은 계산 (범위 안이면 그대로)
+        if pixels == height * width:
+            return height, width
+        new_height = int((pixels * ratio)**0.5)
+        return new_height, int(pixels / new_height)
+
+    if snap == "bucket":
+        bucket_w, bucket_h = min(ASPECT_BUCKETS, key=lambda cur: abs(math.log(cur[1] / cur[0]) - math.log(ratio)))
+        ratio, multiple = bucket_h / bucket_w, 64
+    else:
+        multiple = int(snap)
+    new_height = (pixels * ratio)**0.5
+    return _snap(new_height, multiple), _snap(pixels / new_height, multiple)
+
+def _interpolate(images: torch.Tensor, height: int, width: int, method: str):
+    # (B, C, H, W) 텐서를 리사이즈
+    if method == "lanczos":
+        # comfy lanczos(PIL)는 RGB만 처리하므로 alpha는 따로 리사이즈
+        resized = [comfy_lanczos_resize(images[:, :3], width, height)]
+        for i in range(3, images.shape[1]):
+            resized.append(comfy_lanczos_resize(images[:, i:i + 1].expand(-1, 3, -1, -1), width, height)[:, :1])
+        return torch.cat(resized, dim=1) if len(resized) > 1 else resized[0]
+
+    device = model_management.get_torch_device()
+    images = images.to(device)
+    if method == "area":
+        resized = F.interpolate(images, size=(height, width), mode="area")
+    else:
+        resized = F.interpolate(images, size=(height, width), mode=method, align_corners=False, antialias=True)
+    return resized.clamp_(0, 1)
+
+def resize_cover(images: torch.Tensor, height: int, width: int, method: str = "lanczos"):
+    """
+    IMAGE (B, H, W, C)를 지정한 크기로 리사이즈합니다. 비율이 다르면 덮도록 리사이즈 후 가운데를 자릅니다.
+    alpha 등 모든 채널을 유지합니다.
+    """
+    _, h, w, _ = images.shape
+    if (h, w) == (height, width):
+        return images
+
+    # 비율이 같으면 (반올림 차이 1픽셀 이내) 바로 리사이즈
+    scale = max(height / h, width / w)
+    cover_h, cover_w = max(height, round(h * scale)), max(width, round(w * scale))
+    if abs(cover_h - height) <= 1 and abs(cover_w - width) <= 1:
+        cover_h, cover_w = height, width
+
+    resized = _interpolate(images.permute(0, 3, 1, 2), cover_h, cover_w, method)
+    top, left = (cover_h - height) // 2, (cover_w - width) // 2
+    resized = resized[:, :, top:top + height, left:left + width]
+    return resized.permute(0, 2, 3, 1).to(device=model_management.intermediate_device(), dtype=torch.float32)
+
+def dynamic_resize(image_tensor: torch.Tensor, max_pixels: int = 1024*1024, min_pixels: int = 512*512,
+                   method: str = "lanczos", snap: str = "none"):
+    """
+    이미지를 픽셀 수를 기준으로 동적 resize를 수행합니다.
+
+    Args:
+        image_tensor (torch.Tensor): 이미지 텐서 (B, H, W, C) 또는 (H, W, C)
+        max_pixels (int): 최대 픽셀 수
+        min_pixels (int): 최소 픽셀 수
+        method (str): "lanczos"(CPU, PIL) 또는 "bicubic"/"bilinear"/"area"(torch device, antialias)
+        snap (str): 출력 크기 맞춤 방식 (get_target_size 참고)
+
+    Returns:
+        torch.Tensor: resize된 이미지 텐서
+    """
+    need_unsqueeze = image_tensor.ndim == 3
+    images = image_tensor.unsqueeze(0) if need_unsqueeze else image_tensor
+
+    _, height, width, _ = images.shape
+    new_height, new_width = get_target_size(height, width, max_pixels, min_pixels, snap)
+    resized = resize_cover(images, new_height, new_width, method)
+
+    return resized[0] if need_unsqueeze else resized
+
+def dynamic_resize_list(images: List[torch.Tensor], max_pixels: int = 1024*1024, min_pixels: int = 512*512,
+                        method: str = "lanczos", snap: str = "none", batch_by_bucket: bool = False):
+    """
+    크기가 서로 다른 IMAGE 리스트를 리사이즈합니다.
+    원본 크기와 출력 크기가 같은 이미지들은 하나의 배치로 묶어서 한 번에 리사이즈합니다.
+
+    Args:
+        images (List[torch.Tensor]): IMAGE (B, H, W, C) 리스트
+        batch_by_bucket (bool): True면 출력 크기가 같은 이미지를 하나의 배치로 합쳐서 출력 크기별로 반환
+
+    Returns:
+        List[torch.Tensor]: 입력 순서대로 리사이즈된 IMAGE 리스트 (batch_by_bucket이면 출력 크기별 배치 리스트)
+    """
+    # (원본 크기, 채널 수, 출력 크기) 별로 묶음
+    groups = {}
+    for i, cur in enumerate(images):
+        _, height, width, channels = cur.shape
+        target = get_target_size(height, width, max_pixels, min_pixels, snap)
+        groups.setdefault(((height, width, channels), target), []).append(i)
+
+    outputs = [None] * len(images)
+    for (_, (new_height, new_width)), indices in groups.items():
+        batch = torch.cat([images[i] for i in indices]) if len(indices) > 1 else images[indices[0]]
+        resized = resize_cover(batch, new_height, new_width, method)
+        for i, cur in zip(indices, resized.split([images[i].shape[0] for i in indices])):
+            outputs[i] = cur
+
+    if not batch_by_bucket:
+        return outputs
+
+    # 출력 크기, 채널 수가 같은 이미지끼리 합침 (처음 나온 순서)
+    buckets = {}
+    for cur in outputs:
+        buckets.setdefault(tuple(cur.shape[1:]), []).append(cur)
+    return [torch.cat(cur) for cur in buckets.values()]
@@ -0,0 +1,67 @@
+"""
+상품 이미지 카탈로그 전처리 (ComfyUI 서버 없이 실행)
+
+디렉토리 또는 manifest의 이미지를 리사이즈하고, 텍스트 마스크와 VQ latent를 만들어 출력 디렉토리에 씁니다.
+같은 출력 디렉토리로 다시 실행하면 manifest.jsonl에 기록된 이미지는 건너뜁니다.
+
+사용 예:
+    python scripts/preprocess_catalog.py /data/catalog --output /data/catalog_out \
+        --comfyui /path/to/ComfyUI --vq /path/to/ComfyUI/models/vae_approx/movq.pt --languages en,ko
+"""
+import os
+import sys
+import types
+import logging
+import argparse
+import importlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "productfix"
+
+def load_productfix(comfyui_dir=None):
+    # __init__.py(노드 등록)를 실행하지 않고 productfix 패키지를 등록
+    if comfyui_dir is not None and comfyui_dir not in sys.path:
+        sys.path.insert(0, os.path.abspath(comfyui_dir))
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [REPO_DIR]
+        sys.modules[PACKAGE_NAME] = package
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="이미지 디렉토리 또는 manifest 파일 (경로 목록 또는 JSON lines)")
+    parser.add_argument("--output", required=True, help="출력 디렉토리")
+    parser.add_argument("--comfyui", default=os.environ.get("COMFYUI_DIR", None), help="ComfyUI 설치 경로")
+    parser.add_argument("--vq", default=None, help="VQ 체크포인트 경로 (없으면 latent를 만들지 않음)")
+    parser.add_argument("--languages", default="", help="텍스트 마스크 언어 코드 (예: en,ko, 없으면 마스크를 만들지 않음)")
+    parser.add_argument("--text-mask-mode", default="detect", choices=["detect", "readtext"])
+    parser.add_argument("--max-pixels", type=int, default=1024 * 1024)
+    parser.add_argument("--min-pixels", type=int, default=512 * 512)
+    parser.add_argument("--method", default="lanczos", help="리사이즈 방법 (lanczos, bicubic, bilinear, area)")
+    parser.add_argument("--snap", default="64", help="출력 크기 맞춤 방식 (none, 8, 64, bucket)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4, help="이미지 디코딩 스레드 수")
+    parser.add_argument("--prefetch", type=int, default=16, help="미리 디코딩할 최대 이미지 수")
+    parser.add_argument("--save-images", action="store_true", help="리사이즈한 이미지도 저장")
+    parser.add_argument("--no-resume", action="store_true", help="이전 결과를 무시하고 처음부터 처리")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    load_productfix(args.comfyui)
+    pipeline = importlib.import_module(f"{PACKAGE_NAME}.pipeline")
+
+    vq = None
+    if args.vq is not None:
+        vq = importlib.import_module(f"{PACKAGE_NAME}.vq").load_vq_model(args.vq)
+    languages = [cur.strip() for cur in args.languages.split(",") if cur.strip()]
+
+    stats = pipeline.run_catalog(args.source, args.output, vq=vq, languages=languages or None,
+                                 max_pixels=args.max_pixels, min_pixels=args.min_pixels, method=args.method,
+                                 snap=args.snap, batch_size=args.batch_size, threads=args.threads,
+                                 prefetch=args.prefetch, text_mask_mode=args.text_mask_mode,
+                                 save_images=args.save_images, resume=not args.no_resume)
+    logging.info(f"[middlek pipeline] done: {stats['processed']} processed, {stats['skipped']} skipped "
+                 f"in {stats['elapsed']:.1f}s ({stats['batches']} batches)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+EasyOCR 텍스트 검출 (리더 로드, 텍스트 영역 꼭짓점 검출, 마스크 채우기)
+
+ComfyUI 모듈(comfy, folder_paths)과 패키지 상대 import를 사용하지 않으므로
+GetTextMask process pool 워커(ocr_worker)에서 top-level 모듈로 그대로 import 할 수 있습니다.
+리더 캐시와 마스크 캐시는 ocr 모듈에 있습니다.
+"""
+from typing import List
+import torch
+import numpy as np
+
+def load_reader(languages: List, device: torch.device, model_dir: str, recognizer: bool = True):
+    """
+    EasyOCR 리더를 로드합니다. (캐시하지 않음, 캐시된 리더는 ocr.get_reader 사용)
+
+    Args:
+        languages (List): 언어 코드 리스트
+        device (torch.device): 리더를 실행할 디바이스
+        model_dir (str): EasyOCR 모델 디렉토리
+        recognizer (bool): 인식 모델까지 로드할지 여부 (False면 검출 모델만 로드)
+
+    Returns:
+        easyocr.Reader: 로드된 리더
+    """
+    # easyocr는 무거워서 (ComfyUI 시작 시간) 처음 리더를 로드할 때 import
+    import easyocr
+    device = torch.device(device)
+    gpu = False if device.type == "cpu" else str(device)
+    return easyocr.Reader(list(languages), gpu=gpu, model_storage_directory=model_dir, recognizer=recognizer)
+
+def detect_text_polygons(reader, images: np.ndarray, mode: str = "detect"):
+    """
+    이미지 배치에서 텍스트 영역의 꼭짓점 좌표를 감지합니다.
+
+    Args:
+        reader (easyocr.Reader): EasyOCR 리더
+        images (np.ndarray): 입력 이미지 배열 (B, H, W, C), 0~255 범위, 알파 채널은 사용하지 않음
+        mode (str): "detect"는 검출 모델만 실행, "readtext"는 인식 모델까지 실행
+
+    Returns:
+        List: 이미지별 텍스트 영역 꼭짓점 리스트 [[[x1,y1],[x2,y2],[x3,y3],[x4,y4]], ...]
+    """
+    b, h, w, c = images.shape
+    if c > 3:
+        # reader.detect(reformat=False)는 readtext_batched와 달리 알파 채널을 제거하지 않으므로 RGB만 전달
+        # (CRAFT 정규화는 3채널 입력만 지원)
+        images = np.ascontiguousarray(images[..., :3])
+
+    if mode == "readtext":
+        results = reader.readtext_batched(images, batch_size=b)
+        return [[detection[0] for detection in result] for result in results]
+
+    # 인식 모델 없이 검출 결과만 사용
+    # (readtext_batched와 동일한 입력, 동일한 좌표 처리)
+    horizontal_list_agg, free_list_agg = reader.detect(images, reformat=False)
+
+    polygons = []
+    for horizontal_list, free_list in zip(horizontal_list_agg, free_list_agg):
+        cur_polygons = list(free_list)
+        for box in horizontal_list:
+            x_min, x_max = max(0, box[0]), min(box[1], w)
+            y_min, y_max = max(0, box[2]), min(box[3], h)
+            cur_polygons.append([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]])
+        polygons.append(cur_polygons)
+    return polygons
+
+def fill_polygons(mask: np.ndarray, polygons: List):
+    """
+    uint8 (H, W) 마스크 버퍼에 텍스트 영역 꼭짓점들을 255로 채웁니다.
+    """
+    if len(polygons) == 0:
+        return mask
+    import cv2
+    points = np.asarray(polygons).reshape((len(polygons), -1, 1, 2)).astype(np.int32)
+    # fillPoly에 여러 다각형을 한 번에 넘기면 겹치는 영역이 even-odd 규칙으로 비워지므로
+    # 기존 마스크와 동일한 결과를 위해 다각형마다 채웁니다.
+    for cur_points in points:
+        cv2.fillPoly(mask, [cur_points], 255)
+    return mask
+
+def get_tiles(length: int, tile: int, overlap: int):
+    """
+    길이 length를 overlap 만큼 겹치는 tile 크기 구간들로 나눈 시작 위치 리스트를 반환합니다.
+    """
+    if length <= tile:
+        return [0]
+    stride = max(tile - overlap, 1)
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+def merge_seam_boxes(polygons: List, sources: List):
+    """
+    서로 다른 tile에서 감지되어 겹치는 축 정렬 박스들을 하나의 박스로 합칩니다.
+    tile 경계에 걸쳐 잘린 텍스트가 두 박스로 나뉘는 것을 방지합니다.
+
+    Args:
+        polygons (List): 전체 이미지 좌표의 텍스트 영역 꼭짓점 리스트
+        sources (List): 각 꼭짓점이 감지된 tile 번호
+
+    Returns:
+        List: 중복이 제거된 텍스트 영역 꼭짓점 리스트
+    """
+    boxes, others = [], []
+    for polygon, source in zip(polygons, sources):
+        points = np.asarray(polygon, dtype=np.float64)
+        xs, ys = np.unique(points[:, 0]), np.unique(points[:, 1])
+        # 회전된 박스는 합치지 않고 그대로 유지 (마스크에서는 합집합으로 처리됨)
+        if len(points) == 4 and len(xs) <= 2 and len(ys) <= 2:
+            boxes.append([xs.min(), ys.min(), xs.max(), ys.max(), {source}])
+        else:
+            others.append(polygon)
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[4] & b[4]:
+                    continue
+                inter_w = min(a[2], b[2]) - max(a[0], b[0])
+                inter_h = min(a[3], b[3]) - max(a[1], b[1])
+                if inter_w <= 0 or inter_h <= 0:
+                    continue
+                # 작은 박스 기준으로 절반 이상 겹치면 같은 텍스트로 판단
+                smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+                if inter_w * inter_h >= 0.5 * smaller:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]), a[4] | b[4]]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return others + [[[x0, y0], [x1, y0], [x1, y1], [x0, y1]] for x0, y0, x1, y1, _ in boxes]
+
+def detect_text_polygons_tiled(reader, image: torch.Tensor, mode: str, max_pixels: int, tiling: str = "tile"):
+    """
+    픽셀 예산(max_pixels)을 넘는 큰 이미지에서 텍스트 영역을 감지합니다.
+    한 번에 검출 모델에 들어가는 픽셀 수가 max_pixels를 넘지 않으므로 메모리 사용량이 제한됩니다.
+
+    Args:
+        reader (easyocr.Reader): EasyOCR 리더
+        image (torch.Tensor): 입력 이미지 텐서 (B, H, W, C)
+        mode (str): "detect" 또는 "readtext"
+        max_pixels (int): 검출 한 번에 사용할 최대 픽셀 수
+        tiling (str): "tile"은 겹치는 tile 단위 검출, "downscale"은 축소한 이미지에서 검출
+
+    Returns:
+        List: 이미지별 전체 해상도 기준 텍스트 영역 꼭짓점 리스트
+    """
+    b, h, w, c = image.shape
+    polygons = []
+
+    if tiling == "downscale":
+        import cv2
+        scale = (max_pixels / (h * w)) ** 0.5
+        new_h, new_w = max(int(h * scale), 1), max(int(w * scale), 1)
+        for cur in image:
+            cur = cv2.resize(cur.to("cpu").numpy() * 255.0, (new_w, new_h), interpolation=cv2.INTER_AREA)
+            result = detect_text_polygons(reader, cur[None], mode)[0]
+            # 축소된 좌표를 원본 해상도로 복원
+            polygons.append([(np.asarray(cur_polygon, dtype=np.float64) * [w / new_w, h / new_h]).tolist()
+                             for cur_polygon in result])
+        return polygons
+
+    tile = max(int(max_pixels ** 0.5), 64)
+    overlap = tile // 4
+    tile_h, tile_w = min(tile, h), min(tile, w)
+    for cur in image:
+        cur_polygons, sources = [], []
+        for y in get_tiles(h, tile_h, overlap):
+            for x in get_tiles(w, tile_w, overlap):
+                # tile 단위로만 float 변환하여 전체 해상도 복사본을 만들지 않음
+                crop = cur[y:y + tile_h, x:x + tile_w].to("cpu").numpy() * 255.0
+                for cur_polygon in detect_text_polygons(reader, crop[None], mode)[0]:
+                    cur_polygons.append((np.asarray(cur_polygon, dtype=np.float64) + [x, y]).tolist())
+                    sources.append((y, x))
+        polygons.append(merge_seam_boxes(cur_polygons, sources))
+    return polygons
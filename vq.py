@@ -1,83 +1,521 @@
+import os
+import json
+import time
+import logging
+import contextlib
+import itertools
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 import torch
+import comfy.utils
 from comfy import model_management
-from diffusers.models.vq_model import VQModel
+from comfy.model_patcher import ModelPatcher
+
+from .cache import TensorStore, get_cache_dir, tensor_digest, make_key, env_megabytes
+from .chunking import run_chunked
+from .vq_compile import run_compiled, get_bucket_shape, COMPILE_BUCKET
+from . import profiling
+
+# 로드한 VQ 모델 캐시 설정
+# PRODUCTFIX_VQ_CACHE_SIZE: 동시에 유지할 VQ 모델 수 (0이면 캐시하지 않음)
+VQ_CACHE_SIZE = int(os.environ.get("PRODUCTFIX_VQ_CACHE_SIZE", 2))
+
+_vq_cache = OrderedDict()
+_vq_lock = threading.Lock()
+# 로드 중인 VQ 키 -> 로드가 끝나면 set 되는 event (체크포인트 읽기와 모델 생성은 lock 밖에서 실행)
+_vq_loading = {}
+_vq_stats = {"hits": 0, "misses": 0, "evictions": 0, "loads": 0, "load_time": 0.0}
+
+# VQ 실행 precision (autocast dtype, "default"는 모델 dtype 그대로 실행)
+PRECISIONS = {"default": None, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+# VQ latent 캐시 용량 (MB)
+LATENT_CACHE_MEMORY = env_megabytes("PRODUCTFIX_LATENT_CACHE_MEMORY_MB", 256)
+LATENT_CACHE_DISK = env_megabytes("PRODUCTFIX_LATENT_CACHE_DISK_MB", 2048)
+
+_latent_store = None
+
+# diffusers는 import 시간이 길어서 (ComfyUI 시작 시간) VQ 모델을 처음 로드할 때 import
+if TYPE_CHECKING:
+    from diffusers.models.vq_model import VQModel
+
+# VQ 모델 디바이스 이동 통계 (모든 VQ 모델 합계)
+_residency_lock = threading.Lock()
+_residency_stats = {"calls": 0, "resident_hits": 0, "transfers": 0, "transfer_bytes": 0, "transfer_time": 0.0}
+
+class VQ:
+    """
+    ComfyUI의 VAE와 같이 ModelPatcher로 감싼 VQ 모델
+    model_management의 loaded model 관리를 받으므로, 메모리가 허용하는 동안 디바이스에 남아 있고
+    메모리가 부족하면 다른 모델과 함께 offload 됩니다.
+    """
+    def __init__(self, vqmodel:"VQModel", ckpt:str=None):
+        self.model = vqmodel
+        self.ckpt = ckpt
+        # 체크포인트 파일 식별자 (latent 캐시 키로 사용)
+        self.identity = None
+        if ckpt is not None and os.path.exists(ckpt):
+            stat = os.stat(ckpt)
+            self.identity = (os.path.realpath(ckpt), stat.st_mtime_ns, stat.st_size)
+        self.load_device = model_management.get_torch_device()
+        self.offload_device = model_management.vae_offload_device()
+        # ModelPatcher는 model.device를 설정하는데 diffusers ModelMixin의 device는 setter가 없는 property이므로
+        # ComfyUI VAE의 first_stage_model과 같이 nn.Module로 감싸서 관리
+        self.first_stage_model = torch.nn.Module()
+        self.first_stage_model.vqmodel = self.model
+        self.patcher = ModelPatcher(self.first_stage_model, load_device=self.load_device, offload_device=self.offload_device)
+
+        # 인코더 downscale 비율 (block 수 - 1 만큼 2배 축소)
+        self.downscale_ratio = 2 ** (len(self.model.config.block_out_channels) - 1)
+        self.latent_channels = self.model.config.vq_embed_dim or self.model.config.latent_channels
+        self.memory_format = torch.contiguous_format
+        # torch.compile 결과 캐시 (vq_compile.run_compiled)
+        self.compiled = {}
+
+    @property
+    def dtype(self):
+        return self.model.dtype
+
+    def memory_used_encode(self, shape):
+        # ComfyUI VAE와 같은 기준의 추정치 (입력 이미지 B, C, H, W)
+        return 1767 * shape[0] * shape[2] * shape[3] * model_management.dtype_size(self.dtype)
+
+    def memory_used_decode(self, shape):
+        # ComfyUI VAE와 같은 기준의 추정치 (입력 latent B, C, h, w)
+        return 2178 * shape[0] * shape[2] * shape[3] * 64 * model_management.dtype_size(self.dtype)
+
+    def set_memory_format(self, channels_last:bool):
+        """
+        모델 파라미터의 메모리 형식을 바꿉니다. (channels_last 또는 contiguous)
+        """
+        memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        if self.memory_format != memory_format:
+            self.model.to(memory_format=memory_format)
+            self.memory_format = memory_format
+
+    def is_resident(self):
+        parameter = next(self.model.parameters(), None)
+        return parameter is None or parameter.device == torch.device(self.load_device)
+
+    def load(self, memory_required:int=0):
+        """
+        model_management를 통해 VQ 모델을 디바이스에 올립니다.
+        이미 올라가 있으면 이동 없이 그대로 사용합니다.
+        """
+        resident = self.is_resident()
+        start = time.perf_counter()
+        model_management.load_models_gpu([self.patcher], memory_required=memory_required)
+        elapsed = time.perf_counter() - start
+
+        with _residency_lock:
+            _residency_stats["calls"] += 1
+            if resident:
+                _residency_stats["resident_hits"] += 1
+            elif self.is_resident():
+                _residency_stats["transfers"] += 1
+                _residency_stats["transfer_bytes"] += sum(cur.numel() * cur.element_size() for cur in self.model.parameters())
+                _residency_stats["transfer_time"] += elapsed
+                profiling.record_transfer(sum(cur.numel() * cur.element_size() for cur in self.model.parameters()))
+                profiling.record_time("vq_model_load", elapsed)
+                logging.debug(f"[middlek vq] VQ model is loaded to {self.load_device} in {elapsed:.3f}s")
+
+def as_vq(vqmodel):
+    """
+    VQModel을 VQ로 감쌉니다. 같은 VQModel에는 같은 VQ를 반환합니다.
+    """
+    if isinstance(vqmodel, VQ):
+        return vqmodel
+    vq = getattr(vqmodel, "_productfix_vq", None)
+    if vq is None:
+        vq = VQ(vqmodel)
+        vqmodel._productfix_vq = vq
+    return vq
+
+def get_residency_stats():
+    """
+    VQ 모델 디바이스 이동 횟수, 이동한 byte 수, 이동 시간, 이동 없이 사용한 횟수를 반환합니다.
+    """
+    with _residency_lock:
+        return dict(_residency_stats)
+
+def _read_sidecar_config(ckpt:str):
+    # 체크포인트 옆의 설정 파일 (<이름>.json 또는 같은 디렉토리의 config.json)
+    for path in (os.path.splitext(ckpt)[0] + ".json", os.path.join(os.path.dirname(ckpt), "config.json")):
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return None
+
+def _read_checkpoint(ckpt:str):
+    """
+    체크포인트에서 configs와 state_dict를 읽습니다. 가중치는 복사하지 않고 memory-map으로 엽니다.
+
+    safetensors: state_dict는 파일을 memory-map 하고, configs는 메타데이터의 "configs" (JSON) 또는 sidecar json에서 읽음
+    pickle: torch.load(mmap=True)로 읽음 (예전 형식의 파일이면 일반 torch.load)
+    """
+    if ckpt.endswith(".safetensors"):
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+        with safe_open(ckpt, framework="pt") as f:
+            metadata = f.metadata() or {}
+        configs = json.loads(metadata["configs"]) if "configs" in metadata else _read_sidecar_config(ckpt)
+        return configs, load_file(ckpt, device="cpu")
+
+    try:
+        model_like = torch.load(ckpt, map_location="cpu", mmap=True)
+    except RuntimeError:
+        # zip 형식이 아닌 예전 torch.save 파일은 memory-map 불가
+        model_like = torch.load(ckpt, map_location="cpu")
+    if not isinstance(model_like, dict):
+        return None, None
+    configs = model_like.get("configs", None)
+    if configs is None:
+        configs = _read_sidecar_config(ckpt)
+    return configs, model_like.get("state_dict", None)
+
+def _build_vq_model(configs, state_dict, dtype:torch.dtype):
+    """
+    meta 디바이스에서 VQModel을 만들고 state_dict 텐서를 그대로 파라미터로 사용합니다. (assign=True)
+    실패하면 일반적인 방법(초기화 후 복사)으로 만듭니다.
+    """
+    from diffusers.models.vq_model import VQModel
+    try:
+        with torch.device("meta"):
+            vqmodel = VQModel.from_config(configs)
+        vqmodel.load_state_dict(state_dict, assign=True)
+        # state_dict에 없는 텐서(persistent가 아닌 buffer 등)가 남아 있으면 사용할 수 없음
+        if any(cur.is_meta for cur in itertools.chain(vqmodel.parameters(), vqmodel.buffers())):
+            raise RuntimeError("some tensors are not in the state_dict")
+    except (RuntimeError, NotImplementedError, TypeError) as e:
+        logging.debug(f"[middlek vq] meta device load failed, falling back to regular load: {e}")
+        vqmodel = VQModel.from_config(configs)
+        vqmodel.load_state_dict(state_dict)
+    return vqmodel.to(dtype=dtype)
 
 def load_vq_model(ckpt):
     """
     VQ 모델을 체크포인트에서 로드합니다. diffusers의 VQModel만 가능합니다.
+    경로, 수정 시각, 파일 크기, dtype이 같으면 이미 로드한 VQ를 그대로 반환합니다.
 
     Args:
-        ckpt (str): 체크포인트 파일 경로
+        ckpt (str): 체크포인트 파일 경로 (.safetensors, torch.save 파일 또는 diffusers 모델 디렉토리)
 
     Returns:
-        VQModel: 로드된 VQ 모델
+        VQ: 로드된 VQ 모델
     """
     offload_device: torch.device = model_management.intermediate_device()
     dtype = model_management.VAE_DTYPES[0]
 
-    model_like = torch.load(ckpt, map_location="cpu")
-    
-    configs = model_like.get("configs", None)
-    state_dict = model_like.get("state_dict", None)
+    path = os.path.realpath(ckpt)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, str(dtype))
+
+    while True:
+        with _vq_lock:
+            vq = _vq_cache.get(key, None)
+            if vq is not None:
+                _vq_cache.move_to_end(key)
+                _vq_stats["hits"] += 1
+                return vq
+
+            # 같은 체크포인트를 다른 스레드가 로드 중이면 끝날 때까지 기다린 뒤 캐시를 다시 확인
+            loading = _vq_loading.get(key, None)
+            if loading is None:
+                _vq_stats["misses"] += 1
+                loading = _vq_loading[key] = threading.Event()
+                break
+        loading.wait()
+
+    # 체크포인트 읽기와 모델 생성은 lock 밖에서 실행하여 다른 체크포인트의 캐시 hit와 통계 조회를 막지 않음
+    try:
+        start = time.perf_counter()
+        configs, state_dict = (None, None) if os.path.isdir(path) else _read_checkpoint(path)
+
+        # 체크포인트 형식에 따라 다르게 로드
+        if None in (configs, state_dict):
+            from diffusers.models.vq_model import VQModel
+            vqmodel = VQModel.from_pretrained(ckpt)
+            vqmodel.to(dtype=dtype)
+        else:
+            vqmodel = _build_vq_model(configs, state_dict, dtype)
+        vqmodel.to(device=offload_device)
+        vqmodel.eval()
 
-    # 체크포인트 형식에 따라 다르게 로드
-    if None in (configs, state_dict):
-        vqmodel = VQModel.from_pretrained(ckpt)
+        vq = VQ(vqmodel, ckpt)
+        elapsed = time.perf_counter() - start
+        logging.info(f"\033[94m[middlek vq] VQ model {os.path.basename(ckpt)} is loaded in {elapsed:.2f}s\033[0m")
+
+        with _vq_lock:
+            _vq_stats["loads"] += 1
+            _vq_stats["load_time"] += elapsed
+            if VQ_CACHE_SIZE > 0:
+                _vq_cache[key] = vq
+                while len(_vq_cache) > VQ_CACHE_SIZE:
+                    _vq_cache.popitem(last=False)
+                    _vq_stats["evictions"] += 1
+    finally:
+        # 로드에 실패해도 기다리는 스레드가 다시 시도할 수 있도록 해제
+        with _vq_lock:
+            _vq_loading.pop(key, None)
+        loading.set()
+
+    return vq
+
+def get_vq_cache_stats():
+    """
+    VQ 모델 캐시 hit/miss 횟수, 로드 횟수와 시간을 반환합니다.
+    """
+    with _vq_lock:
+        stats = dict(_vq_stats)
+        stats["cached"] = [os.path.basename(key[0]) for key in _vq_cache.keys()]
+    return stats
+
+def clear_vq_cache():
+    """
+    캐시된 모든 VQ 모델을 제거합니다.
+    """
+    with _vq_lock:
+        _vq_cache.clear()
+
+def get_tile_size(free_memory:int, memory_per_pixel:int, multiple:int, minimum:int):
+    """
+    사용 가능한 메모리로 처리할 수 있는 정사각형 tile 한 변의 크기를 계산합니다.
+    """
+    side = int((free_memory / max(memory_per_pixel, 1)) ** 0.5) // multiple * multiple
+    return max(side, minimum)
+
+@contextlib.contextmanager
+def _inference_context(vq:VQ, precision:str):
+    # autograd 기록 없이 실행하고, precision이 지정되면 해당 dtype으로 autocast
+    # ("default"는 autocast를 만들지 않음, autocast를 지원하지 않는 backend에서는 enabled=False여도 생성자가 실패)
+    autocast_dtype = PRECISIONS[precision]
+    if autocast_dtype is None:
+        autocast = contextlib.nullcontext()
     else:
-        vqmodel = VQModel.from_config(configs)
-        vqmodel.load_state_dict(state_dict)
-    
-    vqmodel.to(device=offload_device, dtype=dtype)
+        autocast = torch.autocast(torch.device(vq.load_device).type, dtype=autocast_dtype)
+    with torch.inference_mode(), autocast:
+        yield
+
+def _preprocess(vq:VQ, images:torch.Tensor):
+    # [0, 1] -> [-1, 1] (B, C, H, W)
+    # 디바이스/dtype 변환으로 이미 복사된 경우에만 in-place로 계산하여 입력 이미지를 변경하지 않음
+    profiling.record_tensor_transfer(images, vq.load_device)
+    x = images.to(device=vq.load_device, dtype=vq.dtype, memory_format=vq.memory_format)
+    if x.untyped_storage().data_ptr() == images.untyped_storage().data_ptr():
+        return x.mul(2).sub_(1)
+    return x.mul_(2).sub_(1)
+
+def _postprocess_(images:torch.Tensor):
+    # [-1, 1] -> [0, 1] (in-place)
+    return images.mul_(0.5).add_(0.5).clamp_(0, 1)
+
+def _encode_chunked(vq:VQ, images:torch.Tensor, precision:str="default", compiled:bool=False):
+    # 사용 가능한 메모리에 맞춰 배치를 나누어 인코딩하고 미리 할당한 출력 텐서에 채움
+    # (OOM이면 chunk를 줄여서 다시 실행, 이미지 한 장도 안 되면 OOM을 그대로 전달)
+    # compiled면 bucket 크기로 padding 하여 compile 된 모델로 실행 (지원하지 않는 크기는 eager)
+    b, c, h, w = images.shape
+    latents = torch.empty((b, vq.latent_channels, h // vq.downscale_ratio, w // vq.downscale_ratio),
+                          device=model_management.intermediate_device(), dtype=vq.dtype)
+
+    def encode_fn(start, end):
+        x = _preprocess(vq, images[start:end])
+        out = run_compiled(vq, "encode", x, precision) if compiled else None
+        return out if out is not None else vq.model.encode(x)["latents"]
+
+    memory_shape = (1, c) + (get_bucket_shape(h, w, COMPILE_BUCKET) if compiled else (h, w))
+    return run_chunked(encode_fn, b, vq.memory_used_encode(memory_shape), vq.load_device, out=latents, name="vq")
+
+def _encode_tiled(vq:VQ, images:torch.Tensor, tile_size:int, overlap:int):
+    # 겹치는 tile 단위로 인코딩하고 겹치는 영역은 feather blending (comfy.utils.tiled_scale)
+    device = vq.load_device
+    b, c, h, w = images.shape
+    if tile_size <= 0:
+        tile_size = get_tile_size(model_management.get_free_memory(device), vq.memory_used_encode((1, 1, 1, 1)),
+                                  multiple=vq.downscale_ratio * 8, minimum=vq.downscale_ratio * 16)
+    tile_size = max(tile_size // vq.downscale_ratio * vq.downscale_ratio, vq.downscale_ratio)
+    overlap = min(overlap, tile_size // 4) // vq.downscale_ratio * vq.downscale_ratio
+
+    steps = b * comfy.utils.get_tiled_scale_steps(w, h, tile_size, tile_size, overlap)
+    pbar = comfy.utils.ProgressBar(steps)
+    encode_fn = lambda x: vq.model.encode(_preprocess(vq, x))["latents"].float()
+    latents = comfy.utils.tiled_scale(images, encode_fn, tile_size, tile_size, overlap,
+                                      upscale_amount=(1 / vq.downscale_ratio), out_channels=vq.latent_channels,
+                                      output_device=model_management.intermediate_device(), pbar=pbar)
+    return latents.to(dtype=vq.dtype)
 
-    return vqmodel
+def _encode(vq:VQ, images:torch.Tensor, tiled:str, tile_size:int, overlap:int, precision:str, channels_last:bool,
+            compiled:bool=False, executed:dict=None):
+    # 이미지 (B, H, W, C)를 tile 설정에 따라 인코딩
+    # executed가 주어지면 실제로 tile 처리했는지 기록 ("tiled")
+    device: torch.device = vq.load_device
+    if executed is None:
+        executed = {}
 
-def vqmodel_encode(images, vqmodel:VQModel):
+    images = images.permute(0,3,1,2)
+    b, c, h, w = images.shape
+    vq.load(vq.memory_used_encode(images.shape))
+    vq.set_memory_format(channels_last)
+
+    with _inference_context(vq, precision):
+        executed["tiled"] = True
+        if tiled == "enable":
+            return _encode_tiled(vq, images, tile_size, overlap)
+
+        # 이미지 한 장도 메모리에 들어가지 않으면 바로 tile 처리
+        if tiled == "auto" and vq.memory_used_encode((1, c, h, w)) > model_management.get_free_memory(device):
+            return _encode_tiled(vq, images, tile_size, overlap)
+
+        try:
+            executed["tiled"] = False
+            return _encode_chunked(vq, images, precision, compiled)
+        except model_management.OOM_EXCEPTION:
+            if tiled != "auto":
+                raise
+            logging.warning("[middlek vq] Ran out of memory when VQ encoding, retrying with tiled VQ encoding.")
+            model_management.soft_empty_cache()
+            executed["tiled"] = True
+            return _encode_tiled(vq, images, tile_size, overlap)
+
+def get_latent_store():
+    """
+    VQ latent 캐시를 반환합니다. (latent는 .npy로 디스크에 저장하고 memory-map으로 불러옴)
+    """
+    global _latent_store
+    if _latent_store is None:
+        _latent_store = TensorStore("vq_latent", get_cache_dir("vq_latent"),
+                                    memory_limit=LATENT_CACHE_MEMORY, disk_limit=LATENT_CACHE_DISK, codec="npy")
+    return _latent_store
+
+def get_latent_cache_stats():
+    """
+    VQ latent 캐시 통계를 반환합니다.
+    """
+    return get_latent_store().stats()
+
+def vqmodel_encode(images, vqmodel:VQ, tiled:str="auto", tile_size:int=0, overlap:int=64, use_cache:bool=False,
+                   precision:str="default", channels_last:bool=False, compiled:bool=False):
     """
     VQ 모델을 사용하여 이미지를 인코딩합니다.
+    모델은 model_management가 관리하므로 매번 offload 하지 않습니다.
 
     Args:
         images (torch.Tensor): 입력 이미지 텐서 (B, H, W, C)
-        vqmodel (VQModel): VQ 모델
+        vqmodel (VQ): VQ 모델
+        tiled (str): "auto"는 메모리가 부족할 때만 tile 처리, "enable"은 항상, "disable"은 사용 안 함
+        tile_size (int): tile 한 변의 크기 (픽셀, 0이면 사용 가능한 메모리로 결정)
+        overlap (int): tile이 겹치는 크기 (픽셀)
+        use_cache (bool): 이미지 digest, VQ 체크포인트, dtype, 실행 설정 기준으로 캐시된 latent 사용 여부
+            (체크포인트 파일에서 로드하지 않은 VQ 모델은 캐시하지 않음)
+        precision (str): "default"는 모델 dtype 그대로, "fp16"/"bf16"은 해당 dtype으로 autocast
+        channels_last (bool): 모델과 입력을 channels_last 메모리 형식으로 실행
+        compiled (bool): torch.compile 된 모델로 실행 (vq_compile.run_compiled, tile 처리는 eager)
 
     Returns:
         torch.Tensor: 인코딩된 잠재 표현
     """
-    device: torch.device = model_management.get_torch_device()
-    offload_device: torch.device = model_management.intermediate_device()
-    dtype = vqmodel.dtype
+    vq = as_vq(vqmodel)
+    execution_options = {"tiled": tiled, "tile_size": tile_size, "overlap": overlap,
+                         "precision": precision, "channels_last": channels_last, "compiled": compiled}
+    if not use_cache or vq.identity is None:
+        return _encode(vq, images, **execution_options)
+
+    # 이미지별 캐시 키 생성 후 캐시에 없는 이미지만 인코딩
+    store = get_latent_store()
+    settings = (vq.identity, str(vq.dtype), tiled, tile_size, overlap, precision, channels_last)
+    if compiled:
+        # bucket padding으로 결과가 eager와 조금 다르므로 따로 캐시 (eager 키는 그대로 유지)
+        settings += (("compiled", COMPILE_BUCKET),)
+    keys = [make_key(tensor_digest(cur), settings) for cur in images]
+    latents = [store.get(key) for key in keys]
+
+    missing = [i for i, cur in enumerate(latents) if cur is None]
+    if len(missing) > 0:
+        executed = {}
+        computed = _encode(vq, images[missing], executed=executed, **execution_options)
+        # "auto"가 메모리 부족으로 tile 처리한 결과는 tile 경계가 blending 되어 있으므로
+        # 메모리가 충분할 때 tile 없이 인코딩하는 "auto" 키로 캐시하지 않음
+        cacheable = tiled != "auto" or not executed["tiled"]
+        for i, latent in zip(missing, computed):
+            if cacheable:
+                # numpy가 지원하지 않는 bfloat16은 float32로 저장
+                store.put(keys[i], latent.float() if latent.dtype == torch.bfloat16 else latent)
+            latents[i] = latent
+
+    logging.debug(f"[middlek vq] VQ latent cache: {len(images) - len(missing)}/{len(images)} hits, "
+                  f"hit rate {store.stats()['hit_rate']:.2f}")
+    device = model_management.intermediate_device()
+    return torch.stack([cur.to(device=device, dtype=vq.dtype) for cur in latents])
+
+def _decode_chunked(vq:VQ, latents:torch.Tensor, precision:str="default", compiled:bool=False):
+    # 사용 가능한 메모리에 맞춰 배치를 나누어 디코딩하고,
+    # 후처리한 결과를 미리 할당한 (B, H, W, C) 출력 텐서에 바로 채움
+    device = vq.load_device
+    b, c, h, w = latents.shape
+    images = torch.empty((b, h * vq.downscale_ratio, w * vq.downscale_ratio, 3), device=model_management.intermediate_device())
 
-    vqmodel.to(device)
-    
-    # 이미지 전처리 및 인코딩
-    images = (images*2-1).permute(0,3,1,2).to(device=device, dtype=dtype)
-    latents = vqmodel.encode(images)["latents"]
-    vqmodel.to(offload_device)
+    def decode_fn(start, end):
+        profiling.record_tensor_transfer(latents[start:end], device)
+        x = latents[start:end].to(device=device, dtype=vq.dtype, memory_format=vq.memory_format)
+        chunk = run_compiled(vq, "decode", x, precision) if compiled else None
+        if chunk is None:
+            chunk = vq.model.decode(x, force_not_quantize=True)["sample"]
+        return _postprocess_(chunk).permute(0, 2, 3, 1)
 
-    return latents
+    memory_shape = (1, c) + (get_bucket_shape(h, w, max(COMPILE_BUCKET // vq.downscale_ratio, 1)) if compiled else (h, w))
+    return run_chunked(decode_fn, b, vq.memory_used_decode(memory_shape), device, out=images, name="vq")
 
-def vqmodel_decode(latents, vqmodel:VQModel):
+def _decode_tiled(vq:VQ, latents:torch.Tensor, tile_size:int, overlap:int):
+    # 겹치는 latent tile 단위로 디코딩하고 겹치는 영역은 feather blending (comfy.utils.tiled_scale)
+    device = vq.load_device
+    b, c, h, w = latents.shape
+    if tile_size > 0:
+        tile = max(tile_size // vq.downscale_ratio, 8)
+    else:
+        tile = get_tile_size(model_management.get_free_memory(device), vq.memory_used_decode((1, 1, 1, 1)), multiple=8, minimum=16)
+    overlap = min(overlap // vq.downscale_ratio, tile // 4)
+
+    steps = b * comfy.utils.get_tiled_scale_steps(w, h, tile, tile, overlap)
+    pbar = comfy.utils.ProgressBar(steps)
+    decode_fn = lambda x: vq.model.decode(x.to(device=device, dtype=vq.dtype, memory_format=vq.memory_format), force_not_quantize=True)["sample"].float()
+    images = comfy.utils.tiled_scale(latents, decode_fn, tile, tile, overlap, upscale_amount=vq.downscale_ratio,
+                                     out_channels=3, output_device=model_management.intermediate_device(), pbar=pbar)
+    return _postprocess_(images).permute(0, 2, 3, 1)
+
+def vqmodel_decode(latents, vqmodel:VQ, tiled:str="auto", tile_size:int=0, overlap:int=64,
+                   precision:str="default", channels_last:bool=False, compiled:bool=False):
     """
     VQ 모델을 사용하여 잠재 표현을 디코딩합니다.
+    모델은 model_management가 관리하므로 매번 offload 하지 않습니다.
 
     Args:
         latents (torch.Tensor): 잠재 표현 텐서
-        vqmodel (VQModel): VQ 모델
+        vqmodel (VQ): VQ 모델
+        tiled (str): "auto"는 메모리가 부족할 때만 tile 처리, "enable"은 항상, "disable"은 사용 안 함
+        tile_size (int): 출력 이미지 기준 tile 한 변의 크기 (픽셀, 0이면 사용 가능한 메모리로 결정)
+        overlap (int): 출력 이미지 기준 tile이 겹치는 크기 (픽셀)
+        precision (str): "default"는 모델 dtype 그대로, "fp16"/"bf16"은 해당 dtype으로 autocast
+        channels_last (bool): 모델과 입력을 channels_last 메모리 형식으로 실행
+        compiled (bool): torch.compile 된 모델로 실행 (vq_compile.run_compiled, tile 처리는 eager)
 
     Returns:
-        torch.Tensor: 디코딩된 이미지 텐서 (B, H, W, C)
+        torch.Tensor: 디코딩된 이미지 텐서 (B, H, W, C), float32
     """
-    device: torch.device = model_management.get_torch_device()
-    offload_device: torch.device = model_management.intermediate_device()
-    dtype = vqmodel.dtype
-
-    vqmodel.to(device)
-    
-    # 잠재 표현 디코딩 및 후처리
-    images = vqmodel.decode(latents.to(device=device, dtype=dtype), force_not_quantize=True)["sample"]
-    images = images * 0.5 + 0.5
-    images = images.clamp(0, 1)
-    images = images.cpu().permute(0, 2, 3, 1).float()
+    vq = as_vq(vqmodel)
+    device: torch.device = vq.load_device
 
-    vqmodel.to(offload_device)
+    b, c, h, w = latents.shape
+    vq.load(vq.memory_used_decode(latents.shape))
+    vq.set_memory_format(channels_last)
 
-    return images
\ No newline at end of file
+    with _inference_context(vq, precision):
+        if tiled == "enable" or (tiled == "auto" and vq.memory_used_decode((1, c, h, w)) > model_management.get_free_memory(device)):
+            return _decode_tiled(vq, latents, tile_size, overlap)
+        try:
+            return _decode_chunked(vq, latents, precision, compiled)
+        except model_management.OOM_EXCEPTION:
+            if tiled != "auto":
+                raise
+            logging.warning("[middlek vq] Ran out of memory when VQ decoding, retrying with tiled VQ decoding.")
+            model_management.soft_empty_cache()
+            return _decode_tiled(vq, latents, tile_size, overlap)
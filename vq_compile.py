@@ -0,0 +1,149 @@
+"""
+VQ 모델 compile 실행 (torch.compile)
+
+입력 크기를 bucket 크기(COMPILE_BUCKET의 배수)로 맞춰서 (replicate padding 후 결과를 잘라냄)
+DynamicImageResize가 만드는 여러 해상도가 적은 수의 compile 결과를 공유하도록 합니다.
+배치는 2의 거듭제곱 크기로 나누어 실행하므로 배치 크기별로도 compile 결과가 최대 log2(B)개만 생깁니다.
+
+compile 결과는 VQ 객체(체크포인트)마다 (방향, bucket, 배치 크기, dtype, precision, 메모리 형식) 별로 캐시되므로
+같은 프로세스에서 다시 compile 하지 않습니다. (프로세스 사이에서는 inductor의 디스크 캐시를 사용)
+bucket이 너무 크거나 downscale 비율로 나누어지지 않는 입력, compile에 실패한 경우에는 eager로 실행합니다.
+(dynamo의 recompile 제한을 넘을 만큼 bucket이 많아지면 dynamo가 eager로 실행하므로 COMPILE_BUCKET을 너무 작게 설정하지 마세요)
+"""
+import os
+import time
+import logging
+import threading
+import torch
+import torch.nn.functional as F
+from comfy import model_management
+
+# bucket 크기 (이미지 픽셀 기준, 높이/너비를 이 값의 배수로 올림)
+# GroupNorm, attention은 이미지 전체 통계를 사용하므로 padding 하면 결과가 eager와 달라집니다.
+# 기본값은 DynamicImageResize snap("64", "bucket")의 배수와 같아서 snap 된 이미지는 padding 없이 실행됩니다.
+COMPILE_BUCKET = int(os.environ.get("PRODUCTFIX_VQ_COMPILE_BUCKET", 64))
+# compile 할 최대 이미지 한 변의 크기 (넘으면 eager)
+COMPILE_MAX_SIZE = int(os.environ.get("PRODUCTFIX_VQ_COMPILE_MAX_SIZE", 2048))
+# torch.compile mode ("default", "reduce-overhead", "max-autotune" 등)
+COMPILE_MODE = os.environ.get("PRODUCTFIX_VQ_COMPILE_MODE", "default")
+
+_compile_lock = threading.Lock()
+_compile_stats = {"compiles": 0, "hits": 0, "fallbacks": 0, "failures": 0, "compile_time": 0.0}
+
+def get_bucket_shape(height: int, width: int, multiple: int):
+    """
+    높이, 너비를 multiple의 배수로 올린 bucket 크기를 반환합니다.
+    """
+    return -(-height // multiple) * multiple, -(-width // multiple) * multiple
+
+def split_batch(batch_size: int):
+    """
+    배치를 2의 거듭제곱 크기로 나눈 (시작, 끝) 리스트를 반환합니다. (예: 7 -> 4, 2, 1)
+    """
+    ranges, start = [], 0
+    while start < batch_size:
+        size = 1 << ((batch_size - start).bit_length() - 1)
+        ranges.append((start, start + size))
+        start += size
+    return ranges
+
+def _forward(vq, direction: str):
+    # compile 할 함수 (VQModel encode/decode의 텐서 출력)
+    if direction == "encode":
+        return lambda x: vq.model.encode(x)["latents"]
+    return lambda x: vq.model.decode(x, force_not_quantize=True)["sample"]
+
+def _get_compiled(vq, key):
+    # VQ 객체에 캐시된 compile 함수 (compile에 실패한 key는 None)
+    with _compile_lock:
+        if key in vq.compiled:
+            return vq.compiled[key], False
+        vq.compiled[key] = torch.compile(_forward(vq, key[0]), dynamic=False, mode=COMPILE_MODE)
+        return vq.compiled[key], True
+
+def is_supported(vq, direction: str, height: int, width: int):
+    """
+    입력 (height, width)를 compile 실행할 수 있는지 반환합니다. (encode는 이미지, decode는 latent 크기)
+    """
+    ratio = vq.downscale_ratio
+    if direction == "encode":
+        image_height, image_width = height, width
+        if height % ratio != 0 or width % ratio != 0:
+            return False
+    else:
+        image_height, image_width = height * ratio, width * ratio
+    return COMPILE_BUCKET % ratio == 0 and max(get_bucket_shape(image_height, image_width, COMPILE_BUCKET)) <= COMPILE_MAX_SIZE
+
+def run_compiled(vq, direction: str, x: torch.Tensor, precision: str):
+    """
+    전처리된 입력 x (B, C, H, W)를 bucket 크기로 padding 하여 compile 된 VQ 모델로 실행하고 원래 크기로 잘라서 반환합니다.
+    지원하지 않는 크기거나 compile에 실패하면 None을 반환합니다. (호출한 쪽에서 eager로 실행)
+    OOM은 그대로 전달합니다.
+
+    Args:
+        vq (VQ): VQ 모델
+        direction (str): "encode" 또는 "decode"
+        x (torch.Tensor): 모델 입력 (이미지는 [-1, 1], latent), 모델 디바이스에 있어야 함
+        precision (str): 실행 precision (캐시 키에 포함)
+
+    Returns:
+        torch.Tensor | None: 모델 출력
+    """
+    b, c, h, w = x.shape
+    if not is_supported(vq, direction, h, w):
+        with _compile_lock:
+            _compile_stats["fallbacks"] += 1
+        return None
+
+    ratio = vq.downscale_ratio
+    multiple = COMPILE_BUCKET if direction == "encode" else COMPILE_BUCKET // ratio
+    bucket_h, bucket_w = get_bucket_shape(h, w, multiple)
+    if (bucket_h, bucket_w) != (h, w):
+        # 가장자리 값을 반복하여 경계 부근 결과가 크게 달라지지 않도록 함
+        x = F.pad(x, (0, bucket_w - w, 0, bucket_h - h), mode="replicate")
+    out_h, out_w = (h // ratio, w // ratio) if direction == "encode" else (h * ratio, w * ratio)
+
+    outputs = []
+    for start, end in split_batch(b):
+        key = (direction, end - start, c, bucket_h, bucket_w, str(vq.dtype), precision, str(vq.memory_format))
+        compiled, created = _get_compiled(vq, key)
+        if compiled is None:
+            return None
+
+        begin = time.perf_counter()
+        try:
+            out = compiled(x[start:end].contiguous(memory_format=vq.memory_format))
+        except model_management.OOM_EXCEPTION:
+            raise
+        except Exception as e:
+            logging.warning(f"[middlek vq] torch.compile failed for {key}, falling back to eager: {e}")
+            with _compile_lock:
+                vq.compiled[key] = None
+                _compile_stats["failures"] += 1
+            return None
+
+        with _compile_lock:
+            if created:
+                elapsed = time.perf_counter() - begin
+                _compile_stats["compiles"] += 1
+                _compile_stats["compile_time"] += elapsed
+                logging.info(f"\033[94m[middlek vq] VQ {direction} is compiled for {key[1:5]} in {elapsed:.2f}s\033[0m")
+            else:
+                _compile_stats["hits"] += 1
+        outputs.append(out[:, :, :out_h, :out_w])
+
+    return torch.cat(outputs) if len(outputs) > 1 else outputs[0]
+
+def get_compile_stats():
+    """
+    compile 횟수, 캐시 hit, eager fallback 횟수, 누적 compile 시간을 반환합니다.
+    """
+    with _compile_lock:
+        return dict(_compile_stats)
+
+def clear_compile_cache(vq):
+    """
+    VQ 모델의 compile 결과를 모두 제거합니다.
+    """
+    with _compile_lock:
+        vq.compiled.clear()